@@ -0,0 +1,258 @@
+"""Benchmarks for router replay, autogeneration and apply paths.
+
+Synthesize migration histories and model packages of given sizes, measure
+time and peak memory of the main code paths against SQLite and report them.
+Results could be appended to a JSON lines file to track them over commits::
+
+    $ python -m benchmarks.bench --sizes 10,100,1000 --output bench_output.txt
+
+"""
+import argparse
+import datetime as dt
+import gc
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import peewee as pw
+
+from peewee_migrate import LOGGER
+from peewee_migrate.router import Router, compile_migrations, load_models
+
+
+DEFAULT_SIZES = (10, 100, 1000, 5000)
+FIELDS_PER_MODEL = 4
+
+MIGRATION_TEMPLATE = '''"""Synthesized migration."""
+import peewee as pw
+
+
+def migrate(migrator, database, fake=False, **kwargs):
+{migrate}
+
+
+def rollback(migrator, database, fake=False, **kwargs):
+{rollback}
+'''
+
+MODEL_TEMPLATE = '''
+class Model{num}(pw.Model):
+    name = pw.CharField(index=True)
+    value = pw.IntegerField(null=True)
+    created_at = pw.DateTimeField(null=True)
+
+    class Meta:
+        table_name = 'table{num}'
+'''
+
+
+def write_history(directory, size):
+    """Write `size` migrations: every model is created and then altered."""
+    for num in range(size):
+        table = 'table%d' % (num // FIELDS_PER_MODEL)
+        if num % FIELDS_PER_MODEL == 0:
+            migrate = '''    @migrator.create_model
+    class Table%d(pw.Model):
+        name = pw.CharField(index=True)
+
+        class Meta:
+            table_name = '%s'
+''' % (num // FIELDS_PER_MODEL, table)
+            rollback = "    migrator.remove_model('%s')" % table
+        else:
+            field = 'field%d' % num
+            migrate = "    migrator.add_fields('%s', %s=pw.IntegerField(null=True))" % (table, field)
+            rollback = "    migrator.remove_fields('%s', '%s')" % (table, field)
+
+        # Router.filemask expects exactly three leading digits
+        path = os.path.join(directory, '000_%05d_migration.py' % (num + 1))
+        with open(path, 'w') as f:
+            f.write(MIGRATION_TEMPLATE.format(migrate=migrate, rollback=rollback))
+
+
+def write_models(directory, size, per_module=50):
+    """Write a package with `size` models for discovery."""
+    package = 'bench_models_%d' % size
+    root = os.path.join(directory, package)
+    os.makedirs(root)
+    open(os.path.join(root, '__init__.py'), 'w').close()
+    for start in range(0, size, per_module):
+        with open(os.path.join(root, 'models_%d.py' % start), 'w') as f:
+            f.write('import peewee as pw\n')
+            for num in range(start, min(start + per_module, size)):
+                f.write(MODEL_TEMPLATE.format(num=num))
+    return package
+
+
+def make_router(directory, size=0):
+    """Create router for in-memory database, mark `size` migrations as applied."""
+    router = Router(pw.SqliteDatabase(':memory:'), migrate_dir=directory)
+    if size:
+        names = router.todo[:size]
+        with router.database.atomic():
+            router.model.insert_many([{'name': name} for name in names]).execute()
+    return router
+
+
+def measure(func, memory=True):
+    """Return (seconds, peak_kb) of given callable."""
+    gc.collect()
+    started = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - started
+
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1] // 1024
+        finally:
+            tracemalloc.stop()
+
+    return seconds, peak
+
+
+def bench_replay(directory, size):
+    """BaseRouter.migrator: fake replay of the applied history."""
+    router = make_router(directory, size)
+
+    def replay():
+        router.__dict__.pop('migrator', None)
+        return router.migrator
+
+    return replay
+
+
+def bench_read(directory, size):
+    """Router.read: load every migration."""
+    router = make_router(directory)
+    names = router.todo
+    return lambda: [router.read(name) for name in names]
+
+
+def bench_diff(directory, size):
+    """compile_migrations/diff_many: diff replayed state with models."""
+    router = make_router(directory, size)
+    migrator = router.migrator
+    models = []
+    for model in migrator.orm.values():
+        attrs = {name: type(field)(null=field.null) for name, field in model._meta.fields.items()
+                 if name != 'id'}
+        attrs['extra'] = pw.TextField(null=True)
+        attrs['Meta'] = type('Meta', (), {'table_name': model._meta.table_name})
+        models.append(type(model.__name__, (pw.Model,), attrs))
+    return lambda: compile_migrations(migrator, models)
+
+
+def bench_run(directory, size):
+    """BaseRouter.run: apply the whole history."""
+    def run():
+        router = make_router(directory)
+        router.run()
+        router.database.close()
+    return run
+
+
+def bench_load_models(directory, size):
+    """load_models: discover models in a package."""
+    package = write_models(directory, size)
+    sys.path.insert(0, directory)
+
+    def load():
+        for name in [name for name in sys.modules if name.startswith(package)]:
+            del sys.modules[name]
+        load_models(package)
+
+    return load
+
+
+BENCHMARKS = {
+    'replay': (bench_replay, True),
+    'read': (bench_read, True),
+    'diff': (bench_diff, True),
+    'run': (bench_run, True),
+    'load_models': (bench_load_models, False),
+}
+
+
+def get_commit():
+    try:
+        output = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode().strip()
+
+
+def run(sizes=DEFAULT_SIZES, names=None, memory=True):
+    """Run benchmarks and return results as list of dicts."""
+    results = []
+    commit = get_commit()
+    level = LOGGER.level
+    LOGGER.setLevel(logging.WARNING)
+    try:
+        for size in sizes:
+            results += run_size(size, names, memory, commit)
+    finally:
+        LOGGER.setLevel(level)
+    return results
+
+
+def run_size(size, names, memory, commit):
+    """Run benchmarks for one size of history and schema."""
+    results = []
+    directory = tempfile.mkdtemp(prefix='pw_migrate_bench_')
+    try:
+        history = os.path.join(directory, 'migrations')
+        os.makedirs(history)
+        write_history(history, size)
+        for name, (factory, needs_history) in BENCHMARKS.items():
+            if names and name not in names:
+                continue
+            func = factory(history if needs_history else directory, size)
+            seconds, peak = measure(func, memory)
+            results.append({
+                'commit': commit, 'date': dt.datetime.utcnow().isoformat(),
+                'python': '%d.%d' % sys.version_info[:2], 'bench': name, 'size': size,
+                'seconds': round(seconds, 6), 'peak_kb': peak,
+            })
+    finally:
+        sys.path[:] = [path for path in sys.path if path != directory]
+        shutil.rmtree(directory)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='Comma separated sizes of histories and schemas')
+    parser.add_argument('--bench', action='append', choices=sorted(BENCHMARKS),
+                        help='Benchmarks to run (all by default)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip peak memory measure')
+    parser.add_argument('--output', help='Append results as JSON lines to the file')
+    args = parser.parse_args(argv)
+
+    results = run([int(size) for size in args.sizes.split(',')], args.bench,
+                  memory=not args.no_memory)
+
+    print('%-12s %8s %12s %12s' % ('bench', 'size', 'seconds', 'peak KiB'))
+    for result in results:
+        print('%-12s %8d %12.4f %12s' % (
+            result['bench'], result['size'], result['seconds'], result['peak_kb']))
+
+    if args.output:
+        with open(args.output, 'a') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -26,11 +26,32 @@ class MigrateHistory(pw.Model):
 
     """Presents the migrations in database."""
 
-    name = pw.CharField()
+    name = pw.CharField()  # unique, index is named by table of a router (see `table_model`)
     migrated_at = pw.DateTimeField(default=dt.datetime.utcnow)
+    duration = pw.FloatField(null=True)  # seconds
 
     def __unicode__(self):
         """String representation."""
         return self.name
 
-from .router import Migrator, Router # noqa
+
+class MigrateJournal(pw.Model):
+
+    """Presents completed operations of migrations in progress."""
+
+    name = pw.CharField()  # unique with operation, see `table_model`
+    operation = pw.IntegerField()
+
+
+def __getattr__(name):
+    """Import migrations machinery on first use to keep the package import cheap."""
+    if name == 'Migrator':
+        from .migrator import Migrator
+        return Migrator
+    if name == 'Router':
+        from .router import Router
+        return Router
+    if name == 'AsyncRouter':
+        from .aio import AsyncRouter
+        return AsyncRouter
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
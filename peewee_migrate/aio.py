@@ -0,0 +1,78 @@
+"""Run migrations from asyncio applications."""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+DONE = object()
+
+
+class AsyncRouter(object):
+
+    """Run router in a dedicated thread, so the event loop stays responsive.
+
+    Peewee is synchronous: migrations (and their connection) live in one worker
+    thread while coroutines await the results and progress of operations.
+
+    >> async with AsyncRouter(Router(database)) as router:
+    >>     async for progress in router.progress():
+    >>         print(progress)
+    """
+
+    def __init__(self, router, executor=None):
+        self.router = router
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='peewee_migrate')
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def call(self, func, *args, **kwargs):
+        """Call blocking function in the router's thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def todo(self):
+        return await self.call(lambda: self.router.todo)
+
+    async def done(self):
+        return await self.call(lambda: self.router.done)
+
+    async def diff(self):
+        return await self.call(lambda: self.router.diff)
+
+    async def run(self, name=None, fake=False, workers=1, lock=False):
+        """Run migrations, return names of applied migrations."""
+        return await self.call(self.router.run, name, fake=fake, workers=workers, lock=lock)
+
+    async def progress(self, name=None, fake=False, workers=1, lock=False):
+        """Run migrations, yield `Progress` of every operation and migration."""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        def notify(event):
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        future = loop.run_in_executor(self.executor, functools.partial(
+            self.router.run, name, fake=fake, workers=workers, progress=notify, lock=lock))
+        future.add_done_callback(lambda _: queue.put_nowait(DONE))
+
+        while True:
+            event = await queue.get()
+            if event is DONE:
+                break
+            yield event
+
+        await future
+
+    async def rollback(self, name):
+        return await self.call(self.router.rollback, name)
+
+    async def close(self):
+        """Shutdown own executor."""
+        if self.own_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self.executor.shutdown)
@@ -1,10 +1,22 @@
+import re
+import decimal
 import peewee as pw
 import collections
 from playhouse.reflection import Column as VanilaColumn
 
+from peewee_migrate import LOGGER
+
 
 INDENT = '    '
 NEWLINE = '\n' + INDENT
+BIG_TABLE_ROWS = 1000000
+OPERATION_COSTS = {
+    'add_index': 'builds an index and blocks writes',
+    'add_not_null': 'scans the table under exclusive lock',
+    'change_fields': 'may rewrite the table under exclusive lock',
+    'remove_fields': 'may rewrite the table under exclusive lock',
+}
+OPERATION_RE = re.compile(r'^migrator\.(\w+)\(')
 FIELD_MODULES_MAP = {
     'ArrayField': 'pw_pext',
     'BinaryJSONField': 'pw_pext',
@@ -22,6 +34,8 @@ def fk_to_params(field):
         params['on_delete'] = "'%s'" % field.on_delete
     if field.on_update is not None:
         params['on_update'] = "'%s'" % field.on_update
+    if not field.index and not field.unique:
+        params['index'] = False  # foreign keys are indexed by default
     return params
 
 
@@ -42,6 +56,15 @@ FIELD_TO_PARAMS = {
 }
 
 
+def callable_to_code(func):
+    """Render callable default from modules imported by migrations (datetime)."""
+    module = getattr(func, '__module__', None) or \
+        getattr(getattr(func, '__self__', None), '__module__', None)
+    if module == 'datetime':
+        return 'dt.' + func.__qualname__
+    return None
+
+
 class Column(VanilaColumn):
 
     def __init__(self, field, migrator=None):  # noqa
@@ -52,10 +75,14 @@ class Column(VanilaColumn):
         )
         if field.default is not None and not callable(field.default):
             self.default = repr(field.default)
+        self.constraints = [node_to_sql(node) for node in field.constraints or []]
 
         if self.field_class in FIELD_TO_PARAMS:
             self.extra_parameters.update(FIELD_TO_PARAMS[self.field_class](field))
 
+        if callable(field.default) and callable_to_code(field.default):
+            self.extra_parameters['default'] = callable_to_code(field.default)
+
         self.rel_model = None
         self.related_name = None
         self.to_field = None
@@ -65,6 +92,18 @@ class Column(VanilaColumn):
             self.related_name = field.backref
             self.rel_model = "migrator.orm['%s']" % field.rel_model._meta.table_name
 
+    def get_field_parameters(self):
+        params = super(Column, self).get_field_parameters()
+        if self.constraints:
+            constraints = list(self.constraints)
+            # explicit default constraint takes place of the default value
+            if self.default is not None and \
+                    not any(c.upper().startswith('DEFAULT ') for c in constraints):
+                constraints.insert(0, 'DEFAULT %s' % self.default)
+            params['constraints'] = '[%s]' % ', '.join(
+                'SQL("%s")' % c.replace('"', '\\"') for c in constraints)
+        return params
+
     def get_field(self, space=' '):
         # Generate the field definition for this column.
         field = super(Column, self).get_field()
@@ -74,25 +113,255 @@ class Column(VanilaColumn):
             name=name, field=field, space=space, module=module)
 
 
+IndexParams = collections.namedtuple(
+    'IndexParams', ('columns', 'unique', 'where', 'using', 'name'))
+
+
+def value_to_sql(value):
+    """Render value as SQL literal."""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return str(value)
+    return "'%s'" % str(value).replace("'", "''")
+
+
+def node_to_sql(node, database=None):
+    """Render SQL node with inlined values."""
+    ctx = database.get_sql_context() if isinstance(database, pw.Database) else pw.Context()
+    with ctx.scope_values(subquery=True):
+        sql, params = ctx.sql(node).query()
+
+    parts = sql.split(ctx.state.param or '?')
+    return parts[0] + ''.join(
+        value_to_sql(value) + part for value, part in zip(params, parts[1:]))
+
+
+def index_to_params(Model, index, database=None):
+    """Convert Meta.indexes item into comparable params."""
+    if isinstance(index, pw.Index):
+        database = database or Model._meta.database
+        columns = tuple(
+            expr.name if isinstance(expr, pw.Field) else
+            expr if isinstance(expr, str) else node_to_sql(expr, database)
+            for expr in index._expressions
+        )
+        where = node_to_sql(index._where, database) if index._where is not None else None
+        return IndexParams(columns, bool(index._unique), where, index._using, index._name)
+
+    if isinstance(index, (list, tuple)):
+        columns, unique = index
+        return IndexParams(tuple(columns), bool(unique), None, None, None)
+
+    return None
+
+
+def model_to_index_params(Model, database=None):
+    """Get Meta.indexes params of given model.
+
+    Plain single field indexes are skipped, they are diffed as field params.
+    """
+    fields = Model._meta.fields
+    indexes = collections.OrderedDict()
+    for index in Model._meta.indexes:
+        params = index_to_params(Model, index, database)
+        if params is None:
+            LOGGER.warning('Index %r of %s is not migrated, use ModelIndex or Model.index()',
+                           getattr(index, 'sql', index), Model._meta.table_name)
+            continue
+
+        if len(params.columns) == 1 and params.columns[0] in fields and \
+                not (params.where or params.using or isinstance(index, pw.Index)):
+            continue
+
+        indexes[params[:4]] = params
+    return indexes
+
+
+def diff_indexes(model1, model2, **kwargs):
+    """Find difference between Meta.indexes of given models.
+
+    Indexes are dropped by table and columns of model2 (before renames).
+
+    :return: (drop_changes, add_changes)
+    """
+    database = getattr(kwargs.get('migrator'), 'database', None)
+    indexes1 = model_to_index_params(model1, database)
+    indexes2 = model_to_index_params(model2, database)
+    drop = [
+        drop_index(model2, params.columns, index_name=params.name)
+        for key, params in indexes2.items() if key not in indexes1
+    ]
+    add = [
+        add_index(model1, params.columns, params.unique, where=params.where,
+                  using=params.using, index_name=params.name)
+        for key, params in indexes1.items() if key not in indexes2
+    ]
+    return drop, add
+
+
+def model_to_leading_fields(Model):
+    """Get names of fields which lead any full (not partial) index of given model."""
+    primary_key = Model._meta.primary_key
+    leading = set()
+    if isinstance(primary_key, pw.CompositeKey):
+        leading.add(primary_key.field_names[0])
+    elif primary_key:
+        leading.add(primary_key.name)
+
+    leading.update(
+        field.name for field in Model._meta.sorted_fields if field.index or field.unique)
+
+    for index in Model._meta.indexes:
+        params = index_to_params(Model, index)
+        if params and params.columns and not params.where:
+            leading.add(params.columns[0])
+
+    return leading
+
+
+def unindexed_foreign_keys(models, state=None):
+    """Find foreign keys which are not covered by leading column of any index.
+
+    :param state: Models of migrations state, foreign keys indexed there are skipped
+        (indexes added by advice of previous migrations).
+    :return: [(Model, field), ...]
+    """
+    state = {Model._meta.table_name: Model for Model in state or []}
+    result = []
+    for Model in pw.sort_models(models):
+        leading = model_to_leading_fields(Model)
+        if Model._meta.table_name in state:
+            leading |= model_to_leading_fields(state[Model._meta.table_name])
+        result += [
+            (Model, field) for field in Model._meta.sorted_fields
+            if isinstance(field, pw.ForeignKeyField) and field.name not in leading
+        ]
+    return result
+
+
+def is_advised_index(model1, model2, name, old_name=None):
+    """Check index of the field differs by advice only (foreign key isn't indexed by model).
+
+    :param old_name: Name of the field in model2 (when it is renamed).
+    """
+    names = [name, old_name or name]
+    fields = [model1._meta.fields[names[0]], model2._meta.fields[names[1]]]
+    if not isinstance(fields[0], pw.ForeignKeyField) or any(field.unique for field in fields):
+        return False
+    return any(name not in model_to_leading_fields(model)
+               for model, name in zip((model1, model2), names))
+
+
+def unindexed_foreign_key_columns(tables):
+    """Find foreign key columns of introspected tables without supporting indexes.
+
+    :return: [(table_name, column_name), ...]
+    """
+    result = []
+    for name, table in sorted(tables.items()):
+        leading = {
+            index.columns[0] for index in table.indexes
+            if index.columns and not (index.sql and ' WHERE ' in index.sql.upper())
+        }
+        leading.update(
+            column.name for column in table.columns.values() if column.primary_key)
+        result += sorted({
+            (name, fk.column) for fk in table.foreign_keys if fk.column not in leading})
+    return result
+
+
+def annotate_changes(Model, changes, sizes):
+    """Comment costly operations with estimated rows count of the table.
+
+    :param sizes: {table_name: rows} from catalog statistics.
+    """
+    rows = sizes.get(Model._meta.table_name) if sizes else None
+    if rows is None:
+        return changes
+
+    annotated = []
+    for change in changes:
+        match = OPERATION_RE.match(change)
+        cost = match and OPERATION_COSTS.get(match.group(1))
+        if cost:
+            change = '# %s%s: ~%s rows, %s %s\n%s' % (
+                'WARNING: ' if rows >= BIG_TABLE_ROWS else '', Model._meta.table_name,
+                '{:,}'.format(rows), match.group(1), cost, change)
+        annotated.append(change)
+    return annotated
+
+
+def same_fields(field1, field2):
+    """Check fields could be renamed one to another (same type and params)."""
+    if type(field1) is not type(field2):
+        return False
+    if isinstance(field1, pw.ForeignKeyField) and \
+            field1.rel_model._meta.table_name != field2.rel_model._meta.table_name:
+        return False
+    return not compare_fields(field1, field2) and not compare_fields(field2, field1)
+
+
+def find_renames(added, removed, same, hinted, confirm=None):
+    """Pair removed and added names which are renames: [(old, new)].
+
+    :param same: same(old, new) checks removed could be renamed to added.
+    :param hinted: hinted(old, new) checks rename is given explicitly.
+    :param confirm: confirm(old, new) accepts detected renames, they aren't detected without it.
+    """
+    pairs = [(old, new) for old in removed for new in added if hinted(old, new)]
+    added = [new for new in added if new not in {new for _, new in pairs}]
+    removed = [old for old in removed if old not in {old for old, _ in pairs}]
+    if confirm is None:
+        return pairs
+
+    for old in removed:
+        matches = [new for new in added if same(old, new)]
+        # only unambiguous pairs
+        if len(matches) != 1 or [o for o in removed if same(o, matches[0])] != [old]:
+            continue
+        if confirm(old, matches[0]):
+            pairs.append((old, matches[0]))
+    return pairs
+
+
 def diff_one(model1, model2, **kwargs):
-    """Find difference between given peewee models."""
+    """Find difference between given peewee models.
+
+    :param renames: {'table.old_field': 'new_field'} hints of renamed fields.
+    :param confirm: confirm('table.old', 'table.new') to accept detected renames of fields.
+    :param advise: Keep indexes of foreign keys which models don't index (advised ones).
+    """
     changes = []
+    sizes = kwargs.pop('sizes', None)
+    renames = kwargs.pop('renames', None) or {}
+    confirm = kwargs.pop('confirm', None)
+    advise = kwargs.pop('advise', False)
 
     fields1 = model1._meta.fields
     fields2 = model2._meta.fields
 
-    # Add fields
-    names1 = set(fields1) - set(fields2)
-    if names1:
-        fields = [fields1[name] for name in names1]
-        changes.append(create_fields(model1, *fields, **kwargs))
+    # Find renamed fields
+    table1, table2 = model1._meta.table_name, model2._meta.table_name
+    renamed = find_renames(
+        [name for name in fields1 if name not in fields2],
+        [name for name in fields2 if name not in fields1],
+        lambda old, new: same_fields(fields2[old], fields1[new]),
+        lambda old, new: new in (renames.get('%s.%s' % (table2, old)),
+                                 renames.get('%s.%s' % (table1, old))),
+        confirm and (lambda old, new: confirm(
+            '%s.%s' % (table1, old), '%s.%s' % (table1, new))))
+    if renamed:
+        fields2 = dict(fields2)
+        for old, new in renamed:
+            fields2[new] = fields2.pop(old)
 
-    # Drop fields
+    names1 = set(fields1) - set(fields2)
     names2 = set(fields2) - set(fields1)
-    if names2:
-        changes.append(drop_fields(model1, *names2))
 
-    # Change fields
+    # Compare fields
     fields_ = []
     nulls_ = []
     indexes_ = []
@@ -108,9 +377,34 @@ def diff_one(model1, model2, **kwargs):
         if null is not None:
             nulls_.append((name, null))
 
-        if index is not None:
+        if index is not None and not (
+                advise and is_advised_index(model1, model2, name, field2.name)):
             indexes_.append((name, index[0], index[1]))
 
+    # Drop indexes by old names of table and columns (before renames), before their
+    # columns could be dropped
+    drop_indexes, add_indexes = diff_indexes(model1, model2, **kwargs)
+    changes += drop_indexes
+    for name, index, unique in indexes_:
+        if fields2[name].unique or fields2[name].index:
+            changes.append(drop_index(model2, fields2[name].name))
+
+    # Rename table and fields
+    if table1 != table2:
+        changes.append(rename_table(model2, table1))
+    for old, new in renamed:
+        changes.append(rename_field(model1, old, new))
+
+    # Add fields
+    if names1:
+        fields = [fields1[name] for name in names1]
+        changes.append(create_fields(model1, *fields, **kwargs))
+
+    # Drop fields
+    if names2:
+        changes.append(drop_fields(model1, *names2))
+
+    # Change fields
     if fields_:
         changes.append(change_fields(model1, *fields_, **kwargs))
 
@@ -119,17 +413,26 @@ def diff_one(model1, model2, **kwargs):
 
     for name, index, unique in indexes_:
         if index is True or unique is True:
-            if fields2[name].unique or fields2[name].index:
-                changes.append(drop_index(model1, name))
             changes.append(add_index(model1, name, unique))
-        else:
-            changes.append(drop_index(model1, name))
 
-    return changes
+    changes += add_indexes
 
+    return annotate_changes(model2, changes, sizes)
 
-def diff_many(models1, models2, migrator=None, reverse=False):
-    """Calculate changes for migrations from models2 to models1."""
+
+def diff_many(models1, models2, migrator=None, reverse=False, sizes=None, renames=None,
+              confirm=None, advise=False):
+    """Calculate changes for migrations from models2 to models1.
+
+    Models are paired by names, then by tables. Renamed tables (fields) are paired
+    by hints or detected when all fields (the field) are the same.
+
+    :param sizes: {table_name: rows} to annotate costly operations.
+    :param renames: {'old_table': 'new_table', 'table.old_field': 'new_field'} hints.
+    :param confirm: confirm(old, new) to accept detected renames, 'table' or 'table.field'
+        are given. Renames aren't detected without it.
+    :param advise: Keep advised indexes of foreign keys (see `unindexed_foreign_keys`).
+    """
     models1 = pw.sort_models(models1)
     models2 = pw.sort_models(models2)
 
@@ -139,20 +442,48 @@ def diff_many(models1, models2, migrator=None, reverse=False):
 
     models1 = collections.OrderedDict([(m._meta.name, m) for m in models1])
     models2 = collections.OrderedDict([(m._meta.name, m) for m in models2])
+    renames = renames or {}
+
+    pairs = {name: models2[name] for name in models1 if name in models2}
+    added = [name for name in models1 if name not in models2]
+    removed = [name for name in models2 if name not in models1]
+
+    # Renamed classes of the same tables
+    tables = {models2[name]._meta.table_name: name for name in removed}
+    for name in added:
+        table = models1[name]._meta.table_name
+        if table in tables:
+            pairs[name] = models2[tables.pop(table)]
+
+    # Renamed tables
+    added = [name for name in added if name not in pairs]
+    removed = [name for name in removed if models2[name] not in pairs.values()]
+    for old, new in find_renames(
+            added, removed,
+            lambda old, new: set(models2[old]._meta.fields) == set(models1[new]._meta.fields) and
+            all(same_fields(field, models1[new]._meta.fields[name])
+                for name, field in models2[old]._meta.fields.items()),
+            lambda old, new: renames.get(models2[old]._meta.table_name) ==
+            models1[new]._meta.table_name,
+            confirm and (lambda old, new: confirm(
+                models2[old]._meta.table_name, models1[new]._meta.table_name))):
+        pairs[new] = models2[old]
 
     changes = []
 
     for name, model1 in models1.items():
-        if name not in models2:
+        if name not in pairs:
             continue
-        changes += diff_one(model1, models2[name], migrator=migrator)
+        model2 = pairs[name]
+        changes += diff_one(model1, model2, migrator=migrator, sizes=sizes, renames=renames,
+                            confirm=confirm, advise=advise)
 
     # Add models
-    for name in [m for m in models1 if m not in models2]:
+    for name in [m for m in models1 if m not in pairs]:
         changes.append(create_model(models1[name], migrator=migrator))
 
     # Remove models
-    for name in [m for m in models2 if m not in models1]:
+    for name in [m for m in models2 if not any(models2[m] is p for p in pairs.values())]:
         changes.append(remove_model(models2[name]))
 
     return changes
@@ -164,6 +495,7 @@ def model_to_code(Model, **kwargs):
 
 {meta}
 """
+    indexes = [index for index in Model._meta.indexes if isinstance(index, (list, tuple))]
     fields = INDENT + NEWLINE.join([
         field_to_code(field, **kwargs) for field in Model._meta.sorted_fields
         if not (isinstance(field, pw.PrimaryKeyField) and field.name == 'id')
@@ -174,10 +506,18 @@ def model_to_code(Model, **kwargs):
         (INDENT + 'schema = "%s"' % Model._meta.schema) if Model._meta.schema else '',
         (INDENT + 'primary_key = pw.CompositeKey{0}'.format(Model._meta.primary_key.field_names))
         if isinstance(Model._meta.primary_key, pw.CompositeKey) else '',
-        (INDENT + 'indexes = %s' % Model._meta.indexes) if Model._meta.indexes else '',
+        (INDENT + 'indexes = %s' % indexes) if indexes else '',
     ]))
 
-    return template.format(classname=Model.__name__, fields=fields, meta=meta)
+    code = template.format(classname=Model.__name__, fields=fields, meta=meta)
+    database = getattr(kwargs.get('migrator'), 'database', None)
+    for index in Model._meta.indexes:
+        if isinstance(index, pw.Index):
+            params = index_to_params(Model, index, database)
+            code += add_index(
+                Model, params.columns, params.unique, where=params.where, using=params.using,
+                index_name=params.name) + '\n'
+    return code
 
 
 def create_model(Model, **kwargs):
@@ -188,6 +528,14 @@ def remove_model(Model, **kwargs):
     return "migrator.remove_model('%s')" % Model._meta.table_name
 
 
+def rename_table(Model, new_name):
+    return "migrator.rename_table('%s', '%s')" % (Model._meta.table_name, new_name)
+
+
+def rename_field(Model, old_name, new_name):
+    return "migrator.rename_field('%s', '%s', '%s')" % (Model._meta.table_name, old_name, new_name)
+
+
 def create_fields(Model, *fields, **kwargs):
     return "migrator.add_fields(%s'%s', %s)" % (
         NEWLINE,
@@ -244,12 +592,183 @@ def change_not_null(Model, name, null):
     return "migrator.%s('%s', %s)" % (operation, Model._meta.table_name, repr(name))
 
 
-def add_index(Model, name, unique):
+def add_index(Model, name, unique, where=None, using=None, index_name=None):
     operation = 'add_index'
-    return "migrator.%s('%s', %s, unique=%s)" %\
-        (operation, Model._meta.table_name, repr(name), unique)
+    names = name if isinstance(name, (list, tuple)) else [name]
+    params = ['unique=%s' % unique]
+    if where:
+        params.append('where=%r' % where)
+    if using:
+        params.append('using=%r' % using)
+    if index_name:
+        params.append('name=%r' % index_name)
+    return "migrator.%s('%s', %s, %s)" %\
+        (operation, Model._meta.table_name, ', '.join(map(repr, names)), ', '.join(params))
+
+
+def drop_index(Model, name, index_name=None):
+    operation = 'drop_index'
+    names = name if isinstance(name, (list, tuple)) else [name]
+    params = [repr(n) for n in names]
+    if index_name:
+        params.append('name=%r' % index_name)
+    return "migrator.%s('%s', %s)" % (operation, Model._meta.table_name, ', '.join(params))
+
+
+def inverse_to_code(call, **kwargs):
+    """Render migrator call which reverts an operation (see `Migrator.invert`)."""
+    if call.method == 'create_model':
+        return create_model(call.args[0], **kwargs)
+
+    params = [repr(arg) for arg in call.args] + [
+        field_to_code(value, False) if isinstance(value, pw.Field) else '%s=%r' % (key, value)
+        for key, value in call.kwargs.items() if value is not None
+    ]
+    return 'migrator.%s(%s)' % (call.method, ', '.join(params))
+
+
+TYPE_PARAMS_RE = re.compile(r'\s*\(.*?\)')
+TYPE_ALIASES = {
+    'BIGSERIAL': 'BIGINT',
+    'BOOL': 'BOOLEAN',
+    'BPCHAR': 'CHAR',
+    'CHARACTER': 'CHAR',
+    'CHARACTER VARYING': 'VARCHAR',
+    'DECIMAL': 'NUMERIC',
+    'DOUBLE': 'DOUBLE PRECISION',
+    'FLOAT4': 'REAL',
+    'FLOAT8': 'DOUBLE PRECISION',
+    'INT': 'INTEGER',
+    'INT2': 'SMALLINT',
+    'INT4': 'INTEGER',
+    'INT8': 'BIGINT',
+    'SERIAL': 'INTEGER',
+    'TIMESTAMP WITHOUT TIME ZONE': 'TIMESTAMP',
+    'TIMESTAMPTZ': 'TIMESTAMP WITH TIME ZONE',
+    'TINYINT': 'BOOLEAN',
+}
 
 
-def drop_index(Model, name):
-    operation = 'drop_index'
-    return "migrator.%s('%s', %s)" % (operation, Model._meta.table_name, repr(name))
+class Drift(collections.namedtuple('Drift', ('table', 'kind', 'name', 'diff'))):
+
+    """Difference between expected and live schema: diff is {param: (expected, actual)}."""
+
+    def __str__(self):
+        return '%s %s.%s: %s' % (self.kind, self.table, self.name, ', '.join(
+            '%s expected %r, got %r' % (param, expected, actual)
+            for param, (expected, actual) in sorted(self.diff.items())))
+
+
+def normalize_type(data_type):
+    """Bring database type to comparable form."""
+    data_type = TYPE_PARAMS_RE.sub('', data_type.upper()).replace(' AUTO_INCREMENT', '')
+    if data_type.startswith('_'):  # postgresql arrays
+        return normalize_type(data_type[1:]) + '[]'
+    return TYPE_ALIASES.get(data_type, data_type)
+
+
+def field_to_type(field, database):
+    """Render field type for given database."""
+    ctx = database.get_sql_context()
+    return normalize_type(ctx.sql(field.ddl_datatype(ctx)).query()[0])
+
+
+def compare_columns(field, column, database, **kwargs):
+    """Find difference between model field and introspected column."""
+    params1 = {'type': field_to_type(field, database)}
+    params2 = {'type': normalize_type(column.data_type)}
+    if not field.primary_key:
+        params1['null'], params2['null'] = field.null, column.null
+
+    return {
+        param: (value, params2[param])
+        for param, value in set(params1.items()) - set(params2.items())
+    }
+
+
+def model_to_indexes(Model):
+    """Get {columns: unique} for indexes of given model."""
+    fields = Model._meta.fields
+    indexes = {
+        (field.column_name,): field.unique for field in Model._meta.sorted_fields
+        if (field.index or field.unique) and not field.primary_key
+    }
+    for index in Model._meta.indexes:
+        params = index_to_params(Model, index)
+        if params is None or not all(name in fields for name in params.columns):
+            continue  # expressions are not comparable with catalogs
+        indexes[tuple(fields[name].column_name for name in params.columns)] = params.unique
+    return indexes
+
+
+def diff_table(Model, table, database, **kwargs):
+    """Find difference between given peewee model and introspected table."""
+    changes = []
+    name = table.name
+
+    fields = {field.column_name: field for field in Model._meta.sorted_fields}
+    for column_name, field in fields.items():
+        column = table.columns.get(column_name)
+        if column is None:
+            changes.append(Drift(name, 'column', column_name, {'exists': (True, False)}))
+            continue
+
+        diff = compare_columns(field, column, database, **kwargs)
+        if diff:
+            changes.append(Drift(name, 'column', column_name, diff))
+
+    for column_name in table.columns:
+        if column_name not in fields:
+            changes.append(Drift(name, 'column', column_name, {'exists': (False, True)}))
+
+    primary_key = tuple(
+        field.column_name for field in Model._meta.sorted_fields if field.primary_key)
+    indexes1 = model_to_indexes(Model)
+    # expressions (None columns) are not comparable with models
+    indexes2 = {
+        tuple(index.columns): index.unique for index in table.indexes
+        if index.columns and None not in index.columns and tuple(index.columns) != primary_key
+    }
+    for columns, unique in indexes1.items():
+        if columns not in indexes2:
+            changes.append(Drift(name, 'index', ', '.join(columns), {'exists': (True, False)}))
+        elif indexes2[columns] != unique:
+            changes.append(Drift(
+                name, 'index', ', '.join(columns), {'unique': (unique, indexes2[columns])}))
+
+    for columns in indexes2:
+        if columns not in indexes1:
+            changes.append(Drift(name, 'index', ', '.join(columns), {'exists': (False, True)}))
+
+    fks1 = {
+        field.column_name: (field.rel_model._meta.table_name, field.rel_field.column_name)
+        for field in Model._meta.sorted_fields if isinstance(field, pw.ForeignKeyField)
+    }
+    fks2 = {fk.column: (fk.dest_table, fk.dest_column) for fk in table.foreign_keys}
+    for column_name in sorted(set(fks1) | set(fks2)):
+        if fks1.get(column_name) != fks2.get(column_name):
+            changes.append(Drift(
+                name, 'foreign_key', column_name,
+                {'references': (fks1.get(column_name), fks2.get(column_name))}))
+
+    return changes
+
+
+def diff_schema(models, tables, database, ignore=None):
+    """Find difference between given peewee models and introspected tables."""
+    changes = []
+    ignore = set(ignore or [])
+    models = collections.OrderedDict(
+        [(m._meta.table_name, m) for m in pw.sort_models(models)])
+
+    for name, Model in models.items():
+        if name not in tables:
+            changes.append(Drift(name, 'table', name, {'exists': (True, False)}))
+            continue
+        changes += diff_table(Model, tables[name], database)
+
+    for name in sorted(tables):
+        if name not in models and name not in ignore:
+            changes.append(Drift(name, 'table', name, {'exists': (False, True)}))
+
+    return changes
@@ -0,0 +1,263 @@
+"""Bulk queries to database catalogs."""
+import collections
+
+import peewee as pw
+from playhouse.migrate import PostgresqlDatabase, SqliteDatabase, MySQLDatabase
+
+
+TableMetadata = collections.namedtuple(
+    'TableMetadata', ('name', 'columns', 'indexes', 'foreign_keys'))
+
+
+class Catalog(object):
+
+    """Read database catalogs."""
+
+    def __init__(self, database):
+        if isinstance(database, pw.Proxy):
+            database = database.obj
+
+        self.database = database
+
+    @classmethod
+    def from_database(cls, database):
+        """Initialize catalog by db."""
+        if isinstance(database, pw.Proxy):
+            database = database.obj
+        if isinstance(database, PostgresqlDatabase):
+            return PostgresqlCatalog(database)
+        if isinstance(database, MySQLDatabase):
+            return MySQLCatalog(database)
+        if isinstance(database, SqliteDatabase):
+            return SqliteCatalog(database)
+        return cls(database)
+
+    def introspect(self, schemas=(None,)):
+        """Introspect tables, columns, indexes and foreign keys of given schemas.
+
+        :return: {schema: {table_name: TableMetadata}}
+        """
+        result = {}
+        for schema in schemas:
+            tables = result[schema] = {}
+            for table in self.database.get_tables(schema=schema):
+                tables[table] = TableMetadata(
+                    table,
+                    {c.name: c for c in self.database.get_columns(table, schema)},
+                    self.database.get_indexes(table, schema),
+                    self.database.get_foreign_keys(table, schema),
+                )
+        return result
+
+    def table_sizes(self, schema=None):
+        """Estimate rows count of tables from catalog statistics.
+
+        :return: {table_name: rows}, tables without statistics are skipped.
+        """
+        return {}
+
+    def _collect(self, schemas, columns, indexes, foreign_keys):
+        """Group catalog rows by schema and table."""
+        result = {schema: {} for schema in schemas.values()}
+
+        def get_table(schema, table):
+            tables = result[schemas[schema]]
+            if table not in tables:
+                tables[table] = TableMetadata(table, {}, [], [])
+            return tables[table]
+
+        for schema, column in columns:
+            get_table(schema, column.table).columns[column.name] = column
+
+        for schema, index in indexes:
+            get_table(schema, index.table).indexes.append(index)
+
+        for schema, fk in foreign_keys:
+            get_table(schema, fk.table).foreign_keys.append(fk)
+
+        return result
+
+
+class SqliteCatalog(Catalog):
+
+    """Read sqlite catalogs."""
+
+    def introspect(self, schemas=(None,)):
+        """Sqlite pragmas are local and cheap, so read them table by table."""
+        result = super(SqliteCatalog, self).introspect(schemas)
+        for tables in result.values():
+            for name in [name for name in tables if name.startswith('sqlite_')]:
+                del tables[name]
+        return result
+
+
+    def table_sizes(self, schema=None):
+        """Read sqlite_stat1 collected by ANALYZE."""
+        schema = schema or 'main'
+        exists = self.database.execute_sql(
+            'SELECT 1 FROM "%s".sqlite_master WHERE type = ? AND name = ?' % schema,
+            ('table', 'sqlite_stat1')).fetchone()
+        if not exists:
+            return {}
+
+        cursor = self.database.execute_sql('SELECT tbl, stat FROM "%s".sqlite_stat1' % schema)
+        return {table: int(stat.split()[0]) for table, stat in cursor if stat}
+
+
+class PostgresqlCatalog(Catalog):
+
+    """Read postgresql catalogs."""
+
+    COLUMNS_SQL = """
+        SELECT n.nspname, c.relname, a.attname, t.typname, NOT a.attnotnull,
+               COALESCE(a.attnum = ANY(pk.conkey), false), pg_get_expr(d.adbin, d.adrelid)
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_type t ON t.oid = a.atttypid
+        LEFT JOIN pg_constraint pk ON pk.conrelid = c.oid AND pk.contype = 'p'
+        LEFT JOIN pg_attrdef d ON d.adrelid = c.oid AND d.adnum = a.attnum
+        WHERE n.nspname = ANY(%s) AND c.relkind IN ('r', 'p')
+            AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY n.nspname, c.relname, a.attnum"""
+
+    INDEXES_SQL = """
+        SELECT n.nspname, c.relname, i.relname, pg_get_indexdef(i.oid),
+               ARRAY(SELECT a.attname FROM unnest(ix.indkey) WITH ORDINALITY k(attnum, ord)
+                     LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+                     ORDER BY k.ord),
+               ix.indisunique
+        FROM pg_index ix
+        JOIN pg_class c ON c.oid = ix.indrelid
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = ANY(%s) AND NOT ix.indisprimary
+        ORDER BY n.nspname, c.relname, i.relname"""
+
+    FOREIGN_KEYS_SQL = """
+        SELECT n.nspname, c.relname, a.attname, rc.relname, ra.attname
+        FROM pg_constraint con
+        JOIN pg_class c ON c.oid = con.conrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_class rc ON rc.oid = con.confrelid
+        JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = con.conkey[1]
+        JOIN pg_attribute ra ON ra.attrelid = con.confrelid AND ra.attnum = con.confkey[1]
+        WHERE con.contype = 'f' AND n.nspname = ANY(%s)
+        ORDER BY n.nspname, c.relname, a.attname"""
+
+    TABLE_SIZES_SQL = """
+        SELECT c.relname, c.reltuples::bigint
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = COALESCE(%s, current_schema()) AND c.relkind IN ('r', 'p')"""
+
+    def table_sizes(self, schema=None):
+        """Read pg_class.reltuples (negative for never analyzed tables)."""
+        cursor = self.database.execute_sql(self.TABLE_SIZES_SQL, (schema,))
+        return {table: rows for table, rows in cursor if rows >= 0}
+
+    def resolve_schemas(self, schemas):
+        """Map catalog schema names to requested ones (None is the current schema)."""
+        current = None
+        if None in schemas:
+            current = self.database.execute_sql('SELECT current_schema()').fetchone()[0]
+        return {current if schema is None else schema: schema for schema in schemas}
+
+    def introspect(self, schemas=(None,)):
+        """Introspect all given schemas with three catalog queries."""
+        schemas = self.resolve_schemas(schemas)
+        names = list(schemas)
+
+        columns = [
+            (schema, pw.ColumnMetadata(name, data_type, null, pk, table, default))
+            for schema, table, name, data_type, null, pk, default
+            in self.database.execute_sql(self.COLUMNS_SQL, (names,))
+        ]
+        indexes = [
+            (schema, pw.IndexMetadata(name, sql, columns_, unique, table))
+            for schema, table, name, sql, columns_, unique
+            in self.database.execute_sql(self.INDEXES_SQL, (names,))
+        ]
+        foreign_keys = [
+            (schema, pw.ForeignKeyMetadata(column, dest_table, dest_column, table))
+            for schema, table, column, dest_table, dest_column
+            in self.database.execute_sql(self.FOREIGN_KEYS_SQL, (names,))
+        ]
+        return self._collect(schemas, columns, indexes, foreign_keys)
+
+
+class MySQLCatalog(Catalog):
+
+    """Read mysql catalogs."""
+
+    COLUMNS_SQL = """
+        SELECT c.table_schema, c.table_name, c.column_name, c.data_type,
+               c.is_nullable = 'YES', c.column_key = 'PRI', c.column_default
+        FROM information_schema.columns c
+        JOIN information_schema.tables t
+            ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+        WHERE c.table_schema IN ({schemas}) AND t.table_type = 'BASE TABLE'
+        ORDER BY c.table_schema, c.table_name, c.ordinal_position"""
+
+    INDEXES_SQL = """
+        SELECT table_schema, table_name, index_name, column_name, non_unique
+        FROM information_schema.statistics
+        WHERE table_schema IN ({schemas}) AND index_name != 'PRIMARY'
+        ORDER BY table_schema, table_name, index_name, seq_in_index"""
+
+    FOREIGN_KEYS_SQL = """
+        SELECT table_schema, table_name, column_name,
+               referenced_table_name, referenced_column_name
+        FROM information_schema.key_column_usage
+        WHERE table_schema IN ({schemas})
+            AND referenced_table_name IS NOT NULL
+            AND referenced_column_name IS NOT NULL
+        ORDER BY table_schema, table_name, column_name"""
+
+    TABLE_SIZES_SQL = """
+        SELECT table_name, table_rows
+        FROM information_schema.tables
+        WHERE table_schema = COALESCE(%s, DATABASE()) AND table_type = 'BASE TABLE'"""
+
+    def table_sizes(self, schema=None):
+        """Read information_schema.tables.table_rows."""
+        cursor = self.database.execute_sql(self.TABLE_SIZES_SQL, (schema,))
+        return {table: int(rows) for table, rows in cursor if rows is not None}
+
+    def resolve_schemas(self, schemas):
+        """Map catalog schema names to requested ones (None is the current database)."""
+        current = None
+        if None in schemas:
+            current = self.database.execute_sql('SELECT DATABASE()').fetchone()[0]
+        return {current if schema is None else schema: schema for schema in schemas}
+
+    def execute(self, sql, names):
+        """Execute catalog query for given schema names."""
+        sql = sql.format(schemas=', '.join(['%s'] * len(names)))
+        return self.database.execute_sql(sql, names)
+
+    def introspect(self, schemas=(None,)):
+        """Introspect all given schemas with three catalog queries."""
+        schemas = self.resolve_schemas(schemas)
+        names = list(schemas)
+
+        columns = [
+            (schema, pw.ColumnMetadata(name, data_type, bool(null), bool(pk), table, default))
+            for schema, table, name, data_type, null, pk, default
+            in self.execute(self.COLUMNS_SQL, names)
+        ]
+
+        indexes = collections.OrderedDict()
+        for schema, table, name, column, non_unique in self.execute(self.INDEXES_SQL, names):
+            key = schema, table, name
+            if key not in indexes:
+                indexes[key] = pw.IndexMetadata(name, None, [], not non_unique, table)
+            indexes[key].columns.append(column)
+
+        foreign_keys = [
+            (schema, pw.ForeignKeyMetadata(column, dest_table, dest_column, table))
+            for schema, table, column, dest_table, dest_column
+            in self.execute(self.FOREIGN_KEYS_SQL, names)
+        ]
+        return self._collect(
+            schemas, columns, [(key[0], index) for key, index in indexes.items()], foreign_keys)
@@ -5,7 +5,6 @@ import re
 import sys
 
 import click
-from playhouse.db_url import connect
 
 
 VERBOSE = ['WARNING', 'INFO', 'DEBUG', 'NOTSET']
@@ -21,6 +20,8 @@ def get_router(directory, database, schema=None, verbose=0):
     config = {}
     migrate_table = 'migratehistory'
     ignore = None
+    verify_manifest = False
+    declarative = False
     conf_path = os.path.join(directory, 'conf.py')
     if os.path.exists(conf_path):
         with open(conf_path) as cfg:
@@ -29,16 +30,21 @@ def get_router(directory, database, schema=None, verbose=0):
             ignore = config.get('IGNORE', ignore)
             schema = config.get('SCHEMA', schema)
             migrate_table = config.get('MIGRATE_TABLE', migrate_table)
+            verify_manifest = config.get('VERIFY_MANIFEST', verify_manifest)
+            declarative = config.get('DECLARATIVE', declarative)
             logging_level = config.get('LOGGING_LEVEL', logging_level).upper()
 
     if isinstance(database, str):
+        from playhouse.db_url import connect
+
         database = connect(database)
 
     LOGGER.setLevel(logging_level)
 
     try:
         return Router(database, migrate_table=migrate_table, migrate_dir=directory,
-                      ignore=ignore, schema=schema)
+                      ignore=ignore, schema=schema, verify_manifest=verify_manifest,
+                      declarative=declarative)
     except RuntimeError as exc:
         LOGGER.error(exc)
         return sys.exit(1)
@@ -72,12 +78,40 @@ def cli():
         'Current directory will be recursively scanned by default.'
     ),
 )
+@click.option(
+    '--advise', default=False, is_flag=True, help=(
+        'Add indexes for foreign keys which have no supporting index.'
+    ),
+)
+@click.option(
+    '--stats', default=False, is_flag=True, help=(
+        'Annotate costly operations with table sizes from database statistics.'
+    ),
+)
+@click.option(
+    '--declarative', default=False, is_flag=True, help=(
+        'Write migration as JSON which is loaded without python code.'
+    ),
+)
+@click.option(
+    '--rename', multiple=True, help=(
+        "Rename instead of drop and add: 'old_table:new_table' or "
+        "'table.old_field:new_field'. Could be passed multiple times."
+    ),
+)
+@click.option(
+    '--detect-renames', type=click.Choice(['no', 'ask', 'yes']), default='no', help=(
+        'Detect renamed fields and tables (same definitions) and ask to confirm '
+        'them or accept all.'
+    ),
+)
 @click.option('--database', default=None, help='Database connection')
 @click.option('--directory', default='migrations', help='Directory where migrations are stored')
 @click.option('--schema', default=None, help='Database schema')
 @click.option('-v', '--verbose', count=True)
 def makemigrations(name=None, database=None, auto=True, auto_source=False, directory=None,
-                   schema=None, verbose=None):
+                   schema=None, verbose=None, advise=False, stats=False, declarative=False,
+                   rename=(), detect_renames='no'):
     """Create a migration automatically
 
     Similar to `create` command, but `auto` is True by default, and `name` not required
@@ -86,9 +120,23 @@ def makemigrations(name=None, database=None, auto=True, auto_source=False, direc
         name = 'auto_{0:%Y%m%d_%H%M}'.format(datetime.datetime.now())
 
     router = get_router(directory, database, schema, verbose)
+    router.declarative = router.declarative or declarative
     if auto and auto_source:
         auto = auto_source
-    name = router.create(name, auto=auto)
+    renames = {}
+    for value in rename:
+        old, sep, new = value.partition(':')
+        if not sep or not old or not new:
+            raise click.BadParameter('Expected OLD:NEW, got %r' % value, param_hint='--rename')
+        renames[old] = new
+
+    confirm = {
+        'no': None,
+        'ask': lambda old, new: click.confirm('Was %s renamed to %s?' % (old, new)),
+        'yes': lambda old, new: True,
+    }[detect_renames]
+    name = router.create(name, auto=auto, advise=advise, stats=stats, renames=renames,
+                         confirm_rename=confirm)
     if name:
         click.echo(f'Migration created: {name}')
 
@@ -98,12 +146,59 @@ def makemigrations(name=None, database=None, auto=True, auto_source=False, direc
 @click.option('--database', default=None, help="Database connection")
 @click.option('--directory', default='migrations', help="Directory where migrations are stored")
 @click.option('--fake', is_flag=True, default=False, help="Run migration as fake.")
+@click.option('--workers', default=1, type=int, help=(
+    "Apply independent migrations (see `depends`) concurrently."))
+@click.option('--lock', is_flag=True, default=False, help=(
+    "Wait for other processes which apply migrations to the database."))
+@click.option('--check', is_flag=True, default=False, help=(
+    "Don't migrate, exit with code 1 when database has unapplied migrations."))
+@click.option('--estimate', is_flag=True, default=False, help=(
+    "Don't migrate, print estimated duration of unapplied migrations."))
+@click.option('--preflight', type=click.Choice(['report', 'wait', 'refuse']), default=None, help=(
+    "Check long transactions which lock tables of migrations before they run: "
+    "report them, wait for them or refuse to migrate."))
+@click.option('--preflight-timeout', default=None, type=float, help=(
+    "Seconds to wait for transactions which lock tables (forever by default)."))
+@click.option('--monitor', is_flag=True, default=False, help=(
+    "Print progress of long operations (index builds, table rewrites) while they run."))
 @click.option('--schema', default=None, help='Database schema')
 @click.option('-v', '--verbose', count=True)
-def migrate(name=None, database=None, directory=None, schema=None, verbose=None, fake=False):
+def migrate(name=None, database=None, directory=None, schema=None, verbose=None, fake=False,
+            workers=1, lock=False, check=False, estimate=False, preflight=None,
+            preflight_timeout=None, monitor=False):
     """Migrate database."""
     router = get_router(directory, database, schema, verbose)
-    migrations = router.run(name, fake=fake)
+    if estimate:
+        from peewee_migrate.estimate import format_estimates
+
+        estimates = router.estimate()
+        if not estimates:
+            click.echo('Database is up to date.')
+            return
+        click.echo(format_estimates(estimates))
+        return
+
+    if check:
+        if not router.is_up_to_date():
+            click.echo('Database has unapplied migrations.')
+            sys.exit(1)
+        click.echo('Database is up to date.')
+        return
+
+    if monitor:
+        from peewee_migrate.monitor import describe_progress
+
+        monitor = lambda progress: click.echo(  # noqa
+            '%s: %s' % (progress.operation, describe_progress(progress)))
+
+    try:
+        migrations = router.run(name, fake=fake, workers=workers, lock=lock, preflight=preflight,
+                                preflight_timeout=preflight_timeout, monitor=monitor or None)
+    except RuntimeError as exc:
+        if not preflight:
+            raise
+        click.echo(str(exc), err=True)
+        sys.exit(1)
     if migrations:
         click.echo('Migrations completed: %s' % ', '.join(migrations))
 
@@ -116,17 +211,19 @@ def migrate(name=None, database=None, directory=None, schema=None, verbose=None,
 @click.option('--auto-source', default=False, help=(
     "Set to python module path for changes autoscan (e.g. 'package.models'). "
     "Current directory will be recursively scanned by default."))
+@click.option('--stats', default=False, is_flag=True, help=(
+    "Annotate costly operations with table sizes from database statistics."))
 @click.option('--database', default=None, help="Database connection")
 @click.option('--directory', default='migrations', help="Directory where migrations are stored")
 @click.option('--schema', default=None, help='Database schema')
 @click.option('-v', '--verbose', count=True)
 def create(name, database=None, auto=False, auto_source=False, directory=None, schema=None,
-           verbose=None):
+           verbose=None, stats=False):
     """Create a migration."""
     router = get_router(directory, database, schema, verbose)
     if auto and auto_source:
         auto = auto_source
-    router.create(name, auto=auto)
+    router.create(name, auto=auto, stats=stats)
 
 
 @cli.command()
@@ -186,3 +283,57 @@ def merge(database=None, directory=None, schema=None, verbose=None):
     """Merge migrations into one."""
     router = get_router(directory, database, schema, verbose)
     router.merge()
+
+
+@cli.command()
+@click.option('--name', default='squashed', help="Checkpoint migration name")
+@click.option('--start', default=None, help=(
+    "First migration to replace. First not squashed migration by default."))
+@click.option('--end', default=None, help="Last migration to replace. Last one by default.")
+@click.option('--database', default=None, help="Database connection")
+@click.option('--directory', default='migrations', help="Directory where migrations are stored")
+@click.option('--schema', default=None, help='Database schema')
+@click.option('-v', '--verbose', count=True)
+def squash(name='squashed', start=None, end=None, database=None, directory=None, schema=None,
+           verbose=None):
+    """Squash migrations into checkpoint, keep history."""
+    router = get_router(directory, database, schema, verbose)
+    try:
+        name = router.squash(name, start=start, end=end)
+    except RuntimeError as exc:
+        click.echo(str(exc), err=True)
+        sys.exit(1)
+    click.echo('Checkpoint created: %s' % name)
+
+
+@cli.command()
+@click.option('--directory', default='migrations', help="Directory where migrations are stored")
+def manifest(directory=None):
+    """Write manifest of migrations for packaged (zipped) distribution."""
+    import peewee as pw
+    from peewee_migrate.router import Router
+
+    # database isn't touched to list migrations
+    names = Router(pw.Proxy(), migrate_dir=directory).write_manifest()
+    click.echo('Manifest written: %s migrations' % len(names))
+
+
+@cli.command()
+@click.option('--database', default=None, help="Database connection")
+@click.option('--directory', default='migrations', help="Directory where migrations are stored")
+@click.option('--schema', default=None, multiple=True, help=(
+    "Database schema to check. Could be passed multiple times."))
+@click.option('-v', '--verbose', count=True)
+def check(database=None, directory=None, schema=None, verbose=None):
+    """Check database schema matches applied migrations."""
+    schemas = schema or [None]
+    router = get_router(directory, database, schemas[0], verbose)
+    drift = router.check(schemas)
+    if not drift:
+        click.echo('No schema drift found.')
+        return
+
+    for name, changes in drift.items():
+        click.echo('Schema drift in %s:' % (name or 'default schema'))
+        click.echo('\n'.join('  %s' % (change,) for change in changes))
+    sys.exit(1)
@@ -0,0 +1,212 @@
+"""Declarative (JSON) migrations.
+
+Autogenerated migrations are plain lists of migrator calls, so they could be
+stored as data and loaded without compiling python code::
+
+    {
+        "migrate": [
+            {"op": "add_fields", "args": ["person"], "kwargs": {
+                "email": {"call": "pw.CharField", "kwargs": {"null": true}}}}
+        ],
+        "rollback": [
+            {"op": "remove_fields", "args": ["person", "email"]}
+        ]
+    }
+
+Values are JSON literals, `{"tuple": [...]}`, references to names available in
+python migrations `{"ref": "pw.CharField"}`, calls of them `{"call": ...}` and
+models of the migrator state `{"orm": "person"}`. Models are created by
+`{"op": "create_model", "model": {"name": ..., "fields": [...], "meta": {...}}}`.
+"""
+import ast
+import datetime as dt
+import decimal
+import json
+import textwrap
+
+import peewee as pw
+
+
+NAMES = {
+    'dt': dt,
+    'pw': pw,
+    'SQL': pw.SQL,
+    'ROUND_HALF_EVEN': decimal.ROUND_HALF_EVEN,
+}
+
+
+def code_to_data(code):
+    """Convert migrator calls (autogenerated code) into operations data.
+
+    Raise ValueError when the code isn't a list of migrator calls.
+    """
+    tree = ast.parse(textwrap.dedent(code or ''))
+    return [statement_to_data(node) for node in tree.body]
+
+
+def statement_to_data(node):
+    if isinstance(node, ast.ClassDef):
+        if [dotted(d) for d in node.decorator_list] not in (['migrator.create_model'],
+                                                           ['migrator.create_table']):
+            raise ValueError('Unsupported model declaration: %s' % node.name)
+        return {'op': 'create_model', 'model': model_to_data(node)}
+
+    if isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+        method = dotted(node.value.func)
+        if method and method.startswith('migrator.') and method.count('.') == 1:
+            return dict(op=method.split('.')[1], **call_to_data(node.value))
+
+    raise ValueError('Unsupported statement: %s' % ast.dump(node))
+
+
+def model_to_data(node):
+    fields, meta = [], {}
+    for item in node.body:
+        if isinstance(item, ast.ClassDef) and item.name == 'Meta':
+            meta = dict(assignment_to_data(assign) for assign in item.body)
+        else:
+            fields.append(list(assignment_to_data(item)))
+    return {'name': node.name, 'fields': fields, 'meta': meta}
+
+
+def assignment_to_data(node):
+    if not (isinstance(node, ast.Assign) and len(node.targets) == 1 and
+            isinstance(node.targets[0], ast.Name)):
+        raise ValueError('Unsupported model attribute: %s' % ast.dump(node))
+    return node.targets[0].id, expression_to_data(node.value)
+
+
+def call_to_data(node):
+    if any(isinstance(arg, ast.Starred) for arg in node.args) or \
+            any(kw.arg is None for kw in node.keywords):
+        raise ValueError('Unsupported call: %s' % ast.dump(node))
+    data = {}
+    if node.args:
+        data['args'] = [expression_to_data(arg) for arg in node.args]
+    if node.keywords:
+        data['kwargs'] = {kw.arg: expression_to_data(kw.value) for kw in node.keywords}
+    return data
+
+
+def expression_to_data(node):
+    if isinstance(node, ast.Constant) and not isinstance(node.value, bytes):
+        return node.value
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and \
+            isinstance(node.operand, ast.Constant):
+        return -node.operand.value
+
+    if isinstance(node, ast.List):
+        return [expression_to_data(elt) for elt in node.elts]
+
+    if isinstance(node, ast.Tuple):
+        return {'tuple': [expression_to_data(elt) for elt in node.elts]}
+
+    if isinstance(node, ast.Subscript) and dotted(node.value) == 'migrator.orm' and \
+            isinstance(node.slice, ast.Constant):
+        return {'orm': node.slice.value}
+
+    if isinstance(node, ast.Call) and is_ref(dotted(node.func)):
+        return dict(call=dotted(node.func), **call_to_data(node))
+
+    name = dotted(node)
+    if is_ref(name):
+        return {'ref': name}
+
+    raise ValueError('Unsupported expression: %s' % ast.dump(node))
+
+
+def is_ref(name):
+    """Check the name could be referenced (from python migrations namespace)."""
+    return bool(name) and name.split('.')[0] in set(NAMES) | {'pw_pext'}
+
+
+def dotted(node):
+    """Get dotted name of attribute/name node, None for other nodes."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = dotted(node.value)
+        return base and '%s.%s' % (base, node.attr)
+    return None
+
+
+def resolve(name):
+    """Get object by dotted name from python migrations namespace."""
+    root, *attrs = name.split('.')
+    if root == 'pw_pext':
+        import playhouse.postgres_ext as obj
+    else:
+        obj = NAMES[root]
+    for attr in attrs:
+        obj = getattr(obj, attr)
+    return obj
+
+
+def decode(value, migrator):
+    """Build value of operation data."""
+    if isinstance(value, list):
+        return [decode(item, migrator) for item in value]
+
+    if not isinstance(value, dict):
+        return value
+
+    if 'tuple' in value:
+        return tuple(decode(item, migrator) for item in value['tuple'])
+
+    if 'orm' in value:
+        return migrator.orm[value['orm']]
+
+    if 'ref' in value:
+        return resolve(value['ref'])
+
+    if 'call' in value:
+        return resolve(value['call'])(
+            *decode(value.get('args', []), migrator),
+            **{key: decode(val, migrator) for key, val in value.get('kwargs', {}).items()})
+
+    raise ValueError('Unsupported value: %r' % (value,))
+
+
+def build_model(data, migrator):
+    """Build model class of create_model operation."""
+    attrs = {name: decode(value, migrator) for name, value in data['fields']}
+    attrs['Meta'] = type('Meta', (), {
+        key: decode(value, migrator) for key, value in data.get('meta', {}).items()})
+    return type(data['name'], (pw.Model,), attrs)
+
+
+def apply(migrator, operations):
+    """Call migrator with operations data."""
+    for operation in operations:
+        if operation['op'] == 'create_model':
+            migrator.create_model(build_model(operation['model'], migrator))
+            continue
+
+        getattr(migrator, operation['op'])(
+            *decode(operation.get('args', []), migrator),
+            **{key: decode(val, migrator) for key, val in operation.get('kwargs', {}).items()})
+
+
+def dumps(migrate, rollback, replaces=None):
+    """Serialize autogenerated migration (code of migrate and rollback)."""
+    data = {'migrate': code_to_data(migrate), 'rollback': code_to_data(rollback)}
+    if replaces:
+        data['replaces'] = list(replaces)
+    return json.dumps(data, indent=2) + '\n'
+
+
+def loads(source):
+    """Load declarative migration into namespace of a python migration."""
+    data = json.loads(source)
+
+    def migrate(migrator, database, fake=False, **kwargs):
+        apply(migrator, data.get('migrate', []))
+
+    def rollback(migrator, database, fake=False, **kwargs):
+        apply(migrator, data['rollback'])
+
+    scope = {'migrate': migrate, 'replaces': data.get('replaces'), 'depends': data.get('depends')}
+    if 'rollback' in data:  # derived from operations otherwise
+        scope['rollback'] = rollback
+    return scope
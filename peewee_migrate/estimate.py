@@ -0,0 +1,128 @@
+"""Estimate duration of migrations before they are applied.
+
+Operations are classified by the work database does for them, costs are
+proportional to rows count of the tables (from catalog statistics).
+"""
+import collections
+
+from playhouse.migrate import Operation, SqliteDatabase
+
+from peewee_migrate.migrator import CreateTable, describe_operation
+
+
+METADATA, INDEX, REWRITE, SCAN = 'metadata', 'index', 'rewrite', 'scan'
+KIND_LABELS = {
+    METADATA: 'metadata only',
+    INDEX: 'index build',
+    REWRITE: 'table rewrite',
+    SCAN: 'full scan',
+}
+# rows per second
+RATES = {
+    INDEX: 200000,
+    REWRITE: 100000,
+    SCAN: 1000000,
+}
+OPERATION_OVERHEAD = 0.01
+# calibration by recorded durations needs enough of estimated work
+CALIBRATION_MIN_SECONDS = 1.0
+
+# kind and seconds are None for unknown operations (sql, python)
+OperationEstimate = collections.namedtuple(
+    'OperationEstimate', ('operation', 'kind', 'table', 'rows', 'seconds'))
+MigrationEstimate = collections.namedtuple(
+    'MigrationEstimate', ('migration', 'seconds', 'operations'))
+
+
+def operation_kind(op, database):
+    """Classify operation by work of the database, None when it is unknown."""
+    if isinstance(op, CreateTable):
+        return METADATA
+    if not isinstance(op, Operation):
+        return None
+
+    sqlite = isinstance(database, SqliteDatabase)
+    method = op.method
+    if method == 'sql':
+        return None
+    if method == 'add_index':
+        return INDEX
+    if method in ('change_column', 'alter_change_column'):
+        return REWRITE
+    if method in ('add_not_null', 'add_foreign_key_constraint'):
+        # sqlite recreates the table to change constraints
+        return REWRITE if sqlite else SCAN
+    if method == 'add_column':
+        # not null columns are filled with default by update of all rows
+        field = op.args[2] if len(op.args) > 2 else op.kwargs.get('field')
+        return METADATA if field is None or field.null else REWRITE
+    if method == 'drop_column' and sqlite and op.kwargs.get('legacy', True):
+        return REWRITE
+    return METADATA
+
+
+def estimate_operations(ops, database, sizes):
+    """Estimate operations with {table_name: rows} sizes: [OperationEstimate]."""
+    result = []
+    for op in ops:
+        kind = operation_kind(op, database)
+        table = op.args[0] if isinstance(op, Operation) and op.args and \
+            isinstance(op.args[0], str) else None
+        rows = sizes.get(table)
+        seconds = None
+        if kind is not None:
+            seconds = OPERATION_OVERHEAD
+            if kind in RATES:
+                seconds += (rows or 0) / RATES[kind]
+        result.append(OperationEstimate(describe_operation(op), kind, table, rows, seconds))
+    return result
+
+
+def total_seconds(operations):
+    """Sum estimated seconds of known operations."""
+    return sum(op.seconds for op in operations if op.seconds is not None)
+
+
+def calibration(estimates, durations):
+    """Ratio of recorded durations to estimates of applied migrations.
+
+    :param estimates: {migration: [OperationEstimate]}
+    :param durations: {migration: seconds} recorded by runs.
+    """
+    estimated = recorded = 0
+    for name, operations in estimates.items():
+        if durations.get(name) is None or any(op.seconds is None for op in operations):
+            continue
+        estimated += total_seconds(operations)
+        recorded += durations[name]
+    if estimated < CALIBRATION_MIN_SECONDS:
+        return 1.0
+    return recorded / estimated
+
+
+def format_seconds(seconds):
+    """Format duration as 1h 2m, 3m 4s or 5.6s."""
+    if seconds >= 3600:
+        return '%dh %dm' % (seconds // 3600, seconds % 3600 // 60)
+    if seconds >= 60:
+        return '%dm %ds' % (seconds // 60, seconds % 60)
+    return '%.1fs' % seconds
+
+
+def format_estimates(estimates):
+    """Describe migration estimates for console."""
+    lines = []
+    for estimate in estimates:
+        lines.append('%s: ~%s' % (estimate.migration, format_seconds(estimate.seconds)))
+        for op in estimate.operations:
+            if op.kind is None:
+                lines.append('  %s: unknown' % op.operation)
+                continue
+            rows = '' if op.rows is None else ', ~{:,} rows'.format(int(op.rows))
+            lines.append('  %s: %s%s, ~%s' % (
+                op.operation, KIND_LABELS[op.kind], rows, format_seconds(op.seconds)))
+    total = sum(estimate.seconds for estimate in estimates)
+    unknown = any(op.kind is None for estimate in estimates for op in estimate.operations)
+    lines.append('Total: ~%s%s' % (
+        format_seconds(total), ' (and unknown operations)' if unknown else ''))
+    return '\n'.join(lines)
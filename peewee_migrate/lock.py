@@ -0,0 +1,147 @@
+"""Coordinate migrations between processes."""
+import os
+import time
+import zlib
+
+import peewee as pw
+from playhouse.migrate import PostgresqlDatabase, SqliteDatabase, MySQLDatabase
+
+
+class Lock(object):
+
+    """Cross-process lock of migrations, does nothing for unknown databases."""
+
+    poll_interval = 0.1
+
+    def __init__(self, database, name='migratehistory'):
+        if isinstance(database, pw.Proxy):
+            database = database.obj
+
+        self.database = database
+        self.name = name
+
+    @classmethod
+    def from_database(cls, database, name='migratehistory'):
+        """Initialize lock by db."""
+        if isinstance(database, pw.Proxy):
+            database = database.obj
+        if isinstance(database, PostgresqlDatabase):
+            return PostgresqlLock(database, name)
+        if isinstance(database, MySQLDatabase):
+            return MySQLLock(database, name)
+        if isinstance(database, SqliteDatabase):
+            return SqliteLock(database, name)
+        return cls(database, name)
+
+    def acquire(self, timeout=None):
+        """Wait for the lock (forever by default), return False on timeout."""
+        deadline = timeout is not None and time.monotonic() + timeout
+        while not self.try_acquire():
+            if deadline and time.monotonic() >= deadline:
+                return False
+            time.sleep(self.poll_interval)
+        return True
+
+    def try_acquire(self):
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        if not self.acquire():
+            raise TimeoutError('Migrations lock %s is not acquired' % self.name)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class PostgresqlLock(Lock):
+
+    """Session level advisory lock."""
+
+    @property
+    def key(self):
+        return zlib.crc32(('peewee_migrate:%s' % self.name).encode())
+
+    def acquire(self, timeout=None):
+        if timeout is None:
+            self.database.execute_sql('SELECT pg_advisory_lock(%s)', (self.key,))
+            return True
+        return super(PostgresqlLock, self).acquire(timeout)
+
+    def try_acquire(self):
+        cursor = self.database.execute_sql('SELECT pg_try_advisory_lock(%s)', (self.key,))
+        return cursor.fetchone()[0]
+
+    def release(self):
+        self.database.execute_sql('SELECT pg_advisory_unlock(%s)', (self.key,))
+
+
+class MySQLLock(Lock):
+
+    """Named lock (GET_LOCK)."""
+
+    def acquire(self, timeout=None):
+        cursor = self.database.execute_sql(
+            'SELECT GET_LOCK(%s, %s)', (self.name, -1 if timeout is None else timeout))
+        return cursor.fetchone()[0] == 1
+
+    def release(self):
+        self.database.execute_sql('SELECT RELEASE_LOCK(%s)', (self.name,))
+
+
+class SqliteLock(Lock):
+
+    """Lock file near the database file, in-memory databases aren't shared."""
+
+    handle = None
+
+    @property
+    def path(self):
+        database = self.database.database
+        if not database or database == ':memory:' or database.startswith('file::memory:'):
+            return None
+        return '%s.%s.lock' % (database, self.name)
+
+    def try_acquire(self):
+        if self.path is None:
+            return True
+
+        handle = open(self.path, 'a+')
+        try:
+            lock_file(handle)
+        except OSError:
+            handle.close()
+            return False
+
+        self.handle = handle
+        return True
+
+    def release(self):
+        if self.handle is not None:
+            unlock_file(self.handle)
+            self.handle.close()
+            self.handle = None
+
+
+if os.name == 'nt':  # pragma: no cover
+    import msvcrt
+
+    def lock_file(handle):
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+
+    def unlock_file(handle):
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+else:
+    import fcntl
+
+    def lock_file(handle):
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def unlock_file(handle):
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
@@ -1,3 +1,7 @@
+import collections
+import re
+from contextlib import nullcontext
+
 import peewee as pw
 from functools import wraps
 from playhouse.migrate import (
@@ -10,8 +14,17 @@ from playhouse.migrate import (
 )
 
 from peewee_migrate import LOGGER
+from peewee_migrate.sqlfile import SqlFile
+
+
+COLUMN_RE = re.compile(r'^\w+$')
+INDEX_NAME_RE = re.compile(r'[^\w]+')
 
 
+def get_index_name(table, columns):
+    """Generate index name for given columns and expressions like peewee does."""
+    return make_index_name(table, [INDEX_NAME_RE.sub('', col.split()[0]) for col in columns])
+
 
 class MigrateOperation:
     def state_forwards(self, migrator: 'Migrator') -> None:
@@ -33,19 +46,36 @@ class MigrateOperation:
 class CreateTable(MigrateOperation):
     def __init__(self, model: pw.Model) -> None:
         self.model = model
+        # indexes added to the model later are created by their own operations
+        self.indexes = model._meta.fields_to_index()
 
     def state_forwards(self, migrator: 'Migrator') -> None:
         migrator.orm[self.model._meta.table_name] = self.model
         self.model._meta.database = migrator.database  # without it we can't run `model.create_table`
 
     def database_forwards(self):
-        self.model.create_table()
+        self.model._meta.fields_to_index = lambda: self.indexes
+        try:
+            self.model.create_table()
+        finally:
+            del self.model._meta.fields_to_index
+
+
+class Inverse(collections.namedtuple('Inverse', ('method', 'args', 'kwargs'))):
+
+    """Migrator call which reverts an operation."""
+
+    def apply(self, migrator):
+        return getattr(migrator, self.method)(*self.args, **self.kwargs)
 
 
 class Migration:
     def __init__(self, migrator: 'Migrator') -> None:
         self.migrator = migrator
         self.ops: list[MigrateOperation] = []
+        # inverse calls of migrator calls, None when a call can't be reverted (sql, python)
+        self.inverse: list = []
+        self.workers = 1
 
     def append(self, op: MigrateOperation) -> None:
         if isinstance(op, MigrateOperation):
@@ -59,15 +89,137 @@ class Migration:
         else:
             op()
 
-    def apply(self) -> None:
-        for op in self.ops:
+    def apply_op(self, op) -> None:
+        monitor = self.migrator.monitor
+        with monitor.watch(describe_operation(op)) if monitor else nullcontext():
             if isinstance(op, MigrateOperation):
                 op.database_forwards()
             else:
                 self.apply_legacy_op(op)
 
+    def apply(self, progress=None, skip=(), done=None) -> None:
+        """Apply operations, call `progress(description)` before every operation.
+
+        :param skip: Numbers of operations to skip (completed by a failed run).
+        :param done: Callable which gets number of every applied operation.
+        """
+        database = self.migrator.database
+        if isinstance(database, pw.Proxy):
+            database = database.obj
+        # SQLite serializes writes, concurrent connections would wait for locks
+        if self.workers > 1 and not isinstance(database, SqliteDatabase):
+            return self.apply_concurrently(progress, skip, done)
+
+        for num, op in enumerate(self.ops):
+            session = is_session_operation(op)
+            if num in skip and not session:
+                continue
+            if progress:
+                progress(describe_operation(op))
+            self.apply_op(op)
+            if done and not session:
+                done(num)
+
+    def apply_concurrently(self, progress=None, skip=(), done=None) -> None:
+        """Apply groups of operations on disjoint tables in threads (separate connections)."""
+        from concurrent.futures import ThreadPoolExecutor
+
+        database = self.migrator.database
+        session = [op for op in self.ops if is_session_operation(op)]
+        numbers = {id(op): num for num, op in enumerate(self.ops)}
+
+        def apply_group(group):
+            try:
+                for op in session + group:
+                    if progress:
+                        progress(describe_operation(op))
+                    self.apply_op(op)
+                    if done and op not in session:
+                        done(numbers[id(op)])
+            finally:
+                database.close()
+
+        ops = [op for num, op in enumerate(self.ops) if num not in skip and op not in session]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for stage in group_operations(ops):
+                list(executor.map(apply_group, stage))
+
     def clean(self) -> None:
         self.ops = list()
+        self.inverse = list()
+        self.workers = 1
+
+
+def is_session_operation(op):
+    """Check operation sets up the connection (it's repeated, not journaled)."""
+    return getattr(op, 'method', None) == 'select_schema'
+
+
+def describe_operation(op):
+    """Describe operation for logs and progress."""
+    if isinstance(op, CreateTable):
+        return 'create_table %s' % op.model._meta.table_name
+    if isinstance(op, Operation):
+        return ' '.join([op.method] + [arg for arg in op.args[:1] if isinstance(arg, str)])
+    if isinstance(op, SqlFile):
+        return 'sql_file %s' % op.path
+    return getattr(op, '__name__', 'python')
+
+
+def operation_tables(op):
+    """Get tables touched by operation, None when they are unknown (sql, python)."""
+    if isinstance(op, CreateTable):
+        meta = op.model._meta
+        return {meta.table_name} | {rel._meta.table_name for rel in meta.refs.values()}
+
+    if not isinstance(op, Operation) or op.method in ('sql', 'select_schema'):
+        return None
+
+    tables = {op.args[0]} if op.args and isinstance(op.args[0], str) else None
+    if tables is None:
+        return None
+    if op.method == 'rename_table':
+        tables.add(op.args[1])
+    if op.method == 'add_foreign_key_constraint':
+        tables.add(op.args[2])
+    for arg in op.args:
+        if isinstance(arg, pw.ForeignKeyField):
+            tables.add(arg.rel_model._meta.table_name)
+    return tables
+
+
+def group_operations(ops):
+    """Split operations into stages of groups which touch disjoint tables.
+
+    Groups of a stage could be applied concurrently, order of operations inside
+    a group is kept. Operations with unknown tables make stages of their own.
+    """
+    stages, groups = [], []
+    for op in ops:
+        tables = operation_tables(op)
+        if tables is None:
+            if groups:
+                stages.append([group for _, group in groups])
+                groups = []
+            stages.append([[op]])
+            continue
+
+        merged = [group for group in groups if group[0] & tables]
+        if not merged:
+            groups.append((tables, [op]))
+            continue
+
+        first_tables, first = merged[0]
+        for group_tables, group in merged[1:]:
+            first_tables |= group_tables
+            first.extend(group)
+        first_tables |= tables
+        first.append(op)
+        groups = [group for group in groups if not any(group is m for m in merged[1:])]
+
+    if groups:
+        stages.append([group for _, group in groups])
+    return stages
 
 
 class SchemaMigrator(ScM):
@@ -109,6 +261,17 @@ class SchemaMigrator(ScM):
         field.null = field_null
         return ctx
 
+    @operation
+    def add_index(self, table, columns, unique=False, using=None, where=None, name=None):
+        """Support partial, expression and named indexes."""
+        ctx = self.make_context()
+        table_obj = pw.Table(table)
+        index = pw.Index(
+            name or get_index_name(table, columns), table_obj,
+            [getattr(table_obj.c, col) if COLUMN_RE.match(col) else SQL(col) for col in columns],
+            unique=unique, using=using, where=where and SQL(where))
+        return ctx.sql(index)
+
     @operation
     def sql(self, sql, *params):
         """Execute raw SQL."""
@@ -168,6 +331,35 @@ class SqliteMigrator(SchemaMigrator, SqM):
         return super(SqliteMigrator, self).drop_column(table, column_name, cascade, legacy, **kwargs)
 
 
+def index_columns(model, columns):
+    """Get column names of index on given fields (expressions are kept)."""
+    fields = model._meta.fields
+    return [
+        (fields[col].column_name if col in fields else col) for col in columns
+        if col in fields or not COLUMN_RE.match(col)
+    ]
+
+
+def index_inverse(model, columns, name=None):
+    """Get migrator call which creates the index again (None when it's unknown)."""
+    table = model._meta.table_name
+    name = name or get_index_name(table, index_columns(model, columns))
+    for index in model._meta.indexes:
+        if isinstance(index, pw.Index) and index._name == name:
+            from peewee_migrate.auto import index_to_params
+
+            params = index_to_params(model, index)
+            return Inverse('add_index', (table,) + tuple(params.columns), dict(
+                unique=params.unique, where=params.where, using=params.using, name=params.name))
+        if isinstance(index, (list, tuple)) and tuple(index[0]) == tuple(columns):
+            return Inverse('add_index', (table,) + tuple(columns), dict(unique=index[1]))
+
+    field = model._meta.fields.get(columns[0]) if len(columns) == 1 else None
+    if field is not None and (field.index or field.unique):
+        return Inverse('add_index', (table,) + tuple(columns), dict(unique=field.unique))
+    return None
+
+
 def get_model(method):
     """Convert string to model class."""
 
@@ -194,7 +386,8 @@ class Migrator(object):
         self.schema = schema
         self.orm = dict()
         self.schema_migrator = SchemaMigrator.from_database(self.database)
-
+        # reports progress of operations while they run (see peewee_migrate.monitor)
+        self.monitor = None
 
         self.migration = Migration(self)
 
@@ -208,20 +401,72 @@ class Migrator(object):
         # for backward compatibility
         return self.schema_migrator 
 
-    def run(self):
-        """Run operations."""
+    def run(self, progress=None, skip=(), done=None):
+        """Run operations.
+
+        :param progress: Callable which gets description of every operation before it runs.
+        :param skip: Numbers of operations to skip (completed by a failed run).
+        :param done: Callable which gets number of every applied operation.
+        """
         if self.schema:
             self.migration.ops.insert(0, self.migrator.select_schema(self.schema))
-        self.migration.apply()
+        self.migration.apply(progress, skip, done)
         self.clean()
 
+    def parallel(self, workers=4):
+        """Apply independent operations of the migration concurrently.
+
+        Operations on disjoint tables are applied by workers on separate connections
+        (outside of the migration transaction), operations with unknown tables
+        (sql, python) wait for others. Useful to build indexes on large tables.
+
+        >> migrator.parallel(8)
+        """
+        self.migration.workers = workers
+
+    def invert(self, method, *args, **kwargs):
+        """Record migrator call which reverts the last call (None method if it can't)."""
+        self.migration.inverse.append(method and Inverse(method, args, kwargs))
+
+    def revert(self):
+        """Revert calls of the migration (in state after it).
+
+        Migrator gets the inverse calls recorded by the migration in state before it.
+
+        >> rollback = before.revert()  # before is migrator after migrate(before, ...)
+        >> rollback(after)
+        """
+        inverse = list(reversed(self.migration.inverse))
+        if None in inverse:
+            raise ValueError('Migration has operations which could not be reverted')
+
+        def rollback(migrator):
+            for call in inverse:
+                call.apply(migrator)
+
+        return rollback
+
     def python(self, func, *args, **kwargs):
         """Run python code."""
         self.ops.append(lambda: func(*args, **kwargs))
+        self.invert(None)
 
     def sql(self, sql, *params):
         """Execure raw SQL."""
         self.ops.append(self.migrator.sql(sql, *params))
+        self.invert(None)
+
+    def sql_file(self, path, batch=1000, encoding='utf-8', progress=None):
+        """Execute SQL file (dump, seed) streaming it by statements.
+
+        Statements are sent by batches, data of COPY FROM STDIN is streamed
+        with COPY protocol (PostgreSQL). `progress(statements, rows)` is called
+        after every batch.
+
+        >> migrator.sql_file('seeds/countries.sql', batch=500)
+        """
+        self.ops.append(SqlFile(self.database, path, batch, encoding, progress))
+        self.invert(None)
 
     def clean(self):
         """Clean the operations."""
@@ -233,6 +478,7 @@ class Migrator(object):
         >> migrator.create_table(model)
         """
         self.ops.append(CreateTable(model))
+        self.invert('remove_model', model._meta.table_name)
         return model
 
     create_model = create_table
@@ -245,6 +491,7 @@ class Migrator(object):
         """
         del self.orm[model._meta.table_name]
         self.ops.append(self.migrator.drop_table(model, cascade))
+        self.invert('create_model', model)
 
     remove_model = drop_table
 
@@ -258,6 +505,7 @@ class Migrator(object):
             if field.unique:
                 self.ops.append(self.migrator.add_index(
                     model._meta.table_name, (field.column_name,), unique=True))
+        self.invert('remove_fields', model._meta.table_name, *fields)
         return model
 
     add_fields = add_columns
@@ -265,6 +513,8 @@ class Migrator(object):
     @get_model
     def change_columns(self, model, **fields):
         """Change fields."""
+        self.invert('change_fields', model._meta.table_name, **{
+            name: model._meta.fields.get(name, field) for name, field in fields.items()})
         for name, field in fields.items():
             old_field = model._meta.fields.get(name, field)
             old_column_name = old_field and old_field.column_name
@@ -313,6 +563,8 @@ class Migrator(object):
         """Remove fields from model."""
         fields = [field for field in model._meta.fields.values() if field.name in names]
         cascade = kwargs.pop('cascade', True)
+        self.invert('add_fields', model._meta.table_name, **{
+            field.name: field for field in fields})
         for field in fields:
             self.__del_field__(model, field)
             if field.unique:
@@ -339,6 +591,7 @@ class Migrator(object):
     @get_model
     def rename_column(self, model, old_name, new_name):
         """Rename field in model."""
+        field_name = old_name
         field = model._meta.fields[old_name]
         if isinstance(field, pw.ForeignKeyField):
             old_name = field.column_name
@@ -348,6 +601,7 @@ class Migrator(object):
         if isinstance(field, pw.ForeignKeyField):
             field.column_name = new_name = field.column_name + '_id'
         self.ops.append(self.migrator.rename_column(model._meta.table_name, old_name, new_name))
+        self.invert('rename_field', model._meta.table_name, field.name, field_name)
         return model
 
     rename_field = rename_column
@@ -360,12 +614,34 @@ class Migrator(object):
         model._meta.table_name = new_name
         self.orm[model._meta.table_name] = model
         self.ops.append(self.migrator.rename_table(old_name, new_name))
+        self.invert('rename_table', new_name, old_name)
         return model
 
     @get_model
     def add_index(self, model, *columns, **kwargs):
-        """Create indexes."""
+        """Create indexes.
+
+        Columns could be field names or SQL expressions. Pass `where` (SQL)
+        for partial indexes, `using` for index method and `name` to override
+        generated index name.
+        """
         unique = kwargs.pop('unique', False)
+        where = kwargs.pop('where', None)
+        using = kwargs.pop('using', None)
+        name = kwargs.pop('name', None)
+        fields = model._meta.fields
+        if where or using or name or any(col not in fields for col in columns):
+            columns_ = [fields[col].column_name if col in fields else col for col in columns]
+            name = name or get_index_name(model._meta.table_name, columns_)
+            model._meta.indexes.append(pw.ModelIndex(
+                model, [fields.get(col, col) for col in columns], unique=unique,
+                where=where and SQL(where), using=using, name=name))
+            self.ops.append(self.migrator.add_index(
+                model._meta.table_name, columns_, unique=unique, using=using, where=where,
+                name=name))
+            self.invert('drop_index', model._meta.table_name, *columns, name=name)
+            return model
+
         model._meta.indexes.append((columns, unique))
         columns_ = []
         for col in columns:
@@ -380,15 +656,25 @@ class Migrator(object):
 
             columns_.append(col)
         self.ops.append(self.migrator.add_index(model._meta.table_name, columns_, unique=unique))
+        self.invert('drop_index', model._meta.table_name, *columns)
         return model
 
     @get_model
-    def drop_index(self, model, *columns):
+    def drop_index(self, model, *columns, **kwargs):
         """Drop indexes."""
+        fields = model._meta.fields
+        unknown = [col for col in columns if col not in fields and COLUMN_RE.match(col)]
+        if unknown:
+            raise ValueError('Index of %s has unknown fields: %s' % (
+                model._meta.table_name, ', '.join(unknown)))
+
+        self.migration.inverse.append(index_inverse(model, columns, kwargs.get('name')))
         columns_ = []
         for col in columns:
             field = model._meta.fields.get(col)
             if not field:
+                if not COLUMN_RE.match(col):
+                    columns_.append(col)  # expression
                 continue
 
             if len(columns) == 1:
@@ -397,8 +683,12 @@ class Migrator(object):
             if isinstance(field, pw.ForeignKeyField):
                 col = col + '_id'
             columns_.append(col)
-        index_name = make_index_name(model._meta.table_name, columns_)
-        model._meta.indexes = [(cols, _) for (cols, _) in model._meta.indexes if columns != cols]
+        index_name = kwargs.pop('name', None) or get_index_name(model._meta.table_name, columns_)
+        model._meta.indexes = [
+            index for index in model._meta.indexes
+            if not (index._name == index_name if isinstance(index, pw.Index) else
+                    isinstance(index, (list, tuple)) and tuple(index[0]) == columns)
+        ]
         self.ops.append(self.migrator.drop_index(model._meta.table_name, index_name))
         return model
 
@@ -409,6 +699,7 @@ class Migrator(object):
             field = model._meta.fields[name]
             field.null = False
             self.ops.append(self.migrator.add_not_null(model._meta.table_name, field.column_name))
+        self.invert('drop_not_null', model._meta.table_name, *names)
         return model
 
     @get_model
@@ -418,6 +709,7 @@ class Migrator(object):
             field = model._meta.fields[name]
             field.null = True
             self.ops.append(self.migrator.drop_not_null(model._meta.table_name, field.column_name))
+        self.invert('add_not_null', model._meta.table_name, *names)
         return model
 
     @get_model
@@ -426,6 +718,7 @@ class Migrator(object):
         field = model._meta.fields[name]
         model._meta.defaults[field] = field.default = default
         self.ops.append(self.migrator.apply_default(model._meta.table_name, name, field))
+        self.invert(None)  # rows are updated
         return model
 
 #  pylama:ignore=W0223,W0212,R
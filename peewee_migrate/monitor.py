@@ -0,0 +1,205 @@
+"""Report progress of long operations (index builds, table rewrites) while they run.
+
+Progress views of the database are polled by a side connection (in a thread)
+while the operation runs on the migration connection.
+"""
+import collections
+import threading
+import time
+from contextlib import contextmanager
+
+import peewee as pw
+from playhouse.migrate import MySQLDatabase, PostgresqlDatabase, SqliteDatabase
+
+from peewee_migrate import LOGGER
+
+
+# done and total are counted in units (blocks, tuples, rows, steps), total could be None
+OperationProgress = collections.namedtuple(
+    'OperationProgress', ('operation', 'phase', 'done', 'total', 'unit', 'elapsed', 'eta'))
+
+
+def log_progress(progress):
+    """Log progress of operation."""
+    LOGGER.info('%s: %s', progress.operation, describe_progress(progress))
+
+
+def describe_progress(progress):
+    """Describe progress as 'phase, 10/20 blocks (50%), elapsed 10s, ETA 10s'."""
+    parts = [progress.phase]
+    if progress.done is not None:
+        if progress.total:
+            parts.append('%d/%d %s (%.0f%%)' % (
+                progress.done, progress.total, progress.unit,
+                100.0 * progress.done / progress.total))
+        else:
+            parts.append('%d %s' % (progress.done, progress.unit))
+    parts.append('elapsed %.0fs' % progress.elapsed)
+    if progress.eta is not None:
+        parts.append('ETA %.0fs' % progress.eta)
+    return ', '.join(parts)
+
+
+def estimate_eta(done, total, elapsed):
+    """Estimate remaining seconds by progress rate, None when it is unknown."""
+    if not done or not total or done >= total:
+        return None
+    return elapsed * (total - done) / done
+
+
+class Monitor(object):
+
+    """Poll progress of operations, reports nothing for unknown databases."""
+
+    def __init__(self, database, callback=None, interval=5.0):
+        """
+        :param callback: Callable which gets `OperationProgress`, logged by default.
+        :param interval: Seconds between reports.
+        """
+        if isinstance(database, pw.Proxy):
+            database = database.obj
+
+        self.database = database
+        self.callback = callback or log_progress
+        self.interval = interval
+        self.sessions = {}
+
+    @classmethod
+    def from_database(cls, database, callback=None, interval=5.0):
+        """Initialize monitor by db."""
+        if isinstance(database, pw.Proxy):
+            database = database.obj
+        if isinstance(database, PostgresqlDatabase):
+            return PostgresqlMonitor(database, callback, interval)
+        if isinstance(database, MySQLDatabase):
+            return MySQLMonitor(database, callback, interval)
+        if isinstance(database, SqliteDatabase):
+            return SqliteMonitor(database, callback, interval)
+        return cls(database, callback, interval)
+
+    def session(self):
+        """Get id of the current session (connection of the operation), it's cached."""
+        connection = self.database.connection()
+        if id(connection) not in self.sessions:
+            self.sessions[id(connection)] = self.read_session()
+        return self.sessions[id(connection)]
+
+    def read_session(self):
+        return None
+
+    def poll(self, session):
+        """Read progress of the session: (phase, done, total, unit) or None."""
+        return None
+
+    @contextmanager
+    def watch(self, operation):
+        """Report progress of the operation which runs in the context."""
+        session = self.session()
+        if session is None:
+            yield
+            return
+
+        stop = threading.Event()
+        started = time.monotonic()
+
+        def run():
+            try:
+                while not stop.wait(self.interval):
+                    state = self.poll(session)
+                    if state is None or stop.is_set():
+                        continue
+                    phase, done, total, unit = state
+                    elapsed = time.monotonic() - started
+                    self.callback(OperationProgress(
+                        operation, phase, done, total, unit, elapsed,
+                        estimate_eta(done, total, elapsed)))
+            except Exception:
+                LOGGER.exception('Progress of %s is not available', operation)
+            finally:
+                self.database.close()
+
+        thread = threading.Thread(target=run, name='peewee_migrate.monitor', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+
+class PostgresqlMonitor(Monitor):
+
+    """Poll pg_stat_progress_create_index and pg_stat_progress_cluster (rewrites)."""
+
+    PROGRESS_SQL = """
+        SELECT phase, blocks_done, blocks_total, tuples_done, tuples_total
+        FROM pg_stat_progress_create_index WHERE pid = %s
+        UNION ALL
+        SELECT phase, heap_blks_scanned, heap_blks_total, heap_tuples_written, NULL
+        FROM pg_stat_progress_cluster WHERE pid = %s"""
+
+    def read_session(self):
+        return self.database.execute_sql('SELECT pg_backend_pid()').fetchone()[0]
+
+    def poll(self, session):
+        row = self.database.execute_sql(self.PROGRESS_SQL, (session, session)).fetchone()
+        if row is None:
+            return None
+        phase, blocks_done, blocks_total, tuples_done, tuples_total = row
+        if blocks_total:
+            return phase, blocks_done, blocks_total, 'blocks'
+        return phase, tuples_done, tuples_total, 'tuples'
+
+
+class MySQLMonitor(Monitor):
+
+    """Poll performance_schema.events_stages_current (stage instruments should be enabled)."""
+
+    PROGRESS_SQL = """
+        SELECT s.EVENT_NAME, s.WORK_COMPLETED, s.WORK_ESTIMATED
+        FROM performance_schema.events_stages_current s
+        JOIN performance_schema.threads t ON t.THREAD_ID = s.THREAD_ID
+        WHERE t.PROCESSLIST_ID = %s"""
+
+    def read_session(self):
+        return self.database.execute_sql('SELECT CONNECTION_ID()').fetchone()[0]
+
+    def poll(self, session):
+        row = self.database.execute_sql(self.PROGRESS_SQL, (session,)).fetchone()
+        if row is None:
+            return None
+        phase, done, total = row
+        return phase.split('/')[-1], done, total, 'rows'
+
+
+class SqliteMonitor(Monitor):
+
+    """Report progress handler calls of the connection.
+
+    Rebuilt tables aren't visible to other connections before commit, so work
+    is reported in virtual machine steps.
+    """
+
+    steps = 100000
+
+    @contextmanager
+    def watch(self, operation):
+        connection = self.database.connection()
+        started = last = time.monotonic()
+        calls = 0
+
+        def handler():
+            nonlocal calls, last
+            calls += 1
+            now = time.monotonic()
+            if now - last >= self.interval:
+                last = now
+                self.callback(OperationProgress(
+                    operation, 'running', calls * self.steps, None, 'steps', now - started, None))
+            return 0
+
+        connection.set_progress_handler(handler, self.steps)
+        try:
+            yield
+        finally:
+            connection.set_progress_handler(None, self.steps)
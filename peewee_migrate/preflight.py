@@ -0,0 +1,107 @@
+"""Find transactions which hold locks on tables of pending migrations.
+
+DDL waits for locks of long transactions (idle in transaction sessions) and
+queries of the application queue behind it. Conflicts are found with one query
+before the first lock is requested.
+"""
+import collections
+import time
+
+import peewee as pw
+from playhouse.migrate import MySQLDatabase, PostgresqlDatabase
+
+
+# transaction which holds a lock on the table, age in seconds
+Conflict = collections.namedtuple('Conflict', ('pid', 'table', 'mode', 'state', 'age', 'query'))
+
+
+class Preflight(object):
+
+    """Check locks of other sessions, finds nothing for unknown databases (SQLite)."""
+
+    poll_interval = 1.0
+    # seconds of transactions which are reported, short ones release locks soon
+    min_age = 5
+
+    def __init__(self, database, schema=None, min_age=None):
+        if isinstance(database, pw.Proxy):
+            database = database.obj
+
+        self.database = database
+        self.schema = schema
+        if min_age is not None:
+            self.min_age = min_age
+
+    @classmethod
+    def from_database(cls, database, schema=None, min_age=None):
+        """Initialize preflight check by db."""
+        if isinstance(database, pw.Proxy):
+            database = database.obj
+        if isinstance(database, PostgresqlDatabase):
+            return PostgresqlPreflight(database, schema, min_age)
+        if isinstance(database, MySQLDatabase):
+            return MySQLPreflight(database, schema, min_age)
+        return cls(database, schema, min_age)
+
+    def conflicts(self, tables=None):
+        """Find transactions which hold locks on the tables (any tables for None).
+
+        :return: [Conflict]
+        """
+        return []
+
+    def wait(self, tables=None, timeout=None):
+        """Wait for conflicting transactions (forever by default), return remaining ones."""
+        deadline = timeout is not None and time.monotonic() + timeout
+        conflicts = self.conflicts(tables)
+        while conflicts and not (deadline and time.monotonic() >= deadline):
+            time.sleep(self.poll_interval)
+            conflicts = self.conflicts(tables)
+        return conflicts
+
+
+class PostgresqlPreflight(Preflight):
+
+    CONFLICTS_SQL = """
+        SELECT a.pid, c.relname, l.mode, a.state,
+               EXTRACT(EPOCH FROM clock_timestamp() - a.xact_start)::float, a.query
+        FROM pg_locks l
+        JOIN pg_class c ON c.oid = l.relation
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        JOIN pg_stat_activity a ON a.pid = l.pid
+        WHERE l.granted AND l.pid <> pg_backend_pid() AND c.relkind IN ('r', 'p')
+          AND n.nspname = COALESCE(%s, current_schema())
+          AND (%s OR c.relname = ANY(%s))
+          AND a.xact_start < clock_timestamp() - make_interval(secs => %s)
+        ORDER BY a.xact_start, c.relname"""
+
+    def conflicts(self, tables=None):
+        cursor = self.database.execute_sql(self.CONFLICTS_SQL, (
+            self.schema, tables is None, sorted(tables or []), self.min_age))
+        return [Conflict(*row) for row in cursor]
+
+
+class MySQLPreflight(Preflight):
+
+    CONFLICTS_SQL = """
+        SELECT t.PROCESSLIST_ID, ml.OBJECT_NAME, ml.LOCK_TYPE, t.PROCESSLIST_STATE,
+               TIMESTAMPDIFF(SECOND, trx.trx_started, NOW()), t.PROCESSLIST_INFO
+        FROM performance_schema.metadata_locks ml
+        JOIN performance_schema.threads t ON t.THREAD_ID = ml.OWNER_THREAD_ID
+        JOIN information_schema.innodb_trx trx ON trx.trx_mysql_thread_id = t.PROCESSLIST_ID
+        WHERE ml.OBJECT_TYPE = 'TABLE' AND ml.LOCK_STATUS = 'GRANTED'
+          AND t.PROCESSLIST_ID <> CONNECTION_ID()
+          AND ml.OBJECT_SCHEMA = COALESCE(%s, DATABASE())
+          AND ({tables})
+          AND trx.trx_started < NOW() - INTERVAL %s SECOND
+        ORDER BY trx.trx_started, ml.OBJECT_NAME"""
+
+    def conflicts(self, tables=None):
+        tables = None if tables is None else sorted(tables)
+        condition = 'TRUE'
+        if tables is not None:
+            condition = tables and 'ml.OBJECT_NAME IN (%s)' % ', '.join(['%s'] * len(tables))
+        cursor = self.database.execute_sql(
+            self.CONFLICTS_SQL.format(tables=condition or 'FALSE'),
+            [self.schema] + (tables or []) + [self.min_age])
+        return [Conflict(*row) for row in cursor]
@@ -1,16 +1,20 @@
+import ast
+import collections
+import hashlib
 import os
 import re
 import sys
+import threading
+import time
 import typing
+from contextlib import contextmanager
 from importlib import import_module
 
-import pkgutil
-from unittest import mock
 import peewee as pw
-from functools import cached_property
+from functools import cached_property, lru_cache
 
-from peewee_migrate import LOGGER, MigrateHistory
-from peewee_migrate.auto import diff_many, NEWLINE
+from peewee_migrate import LOGGER, MigrateHistory, MigrateJournal
+from peewee_migrate.catalog import Catalog
 from peewee_migrate.utils import exec_in
 from peewee_migrate.migrator import Migrator
 
@@ -20,8 +24,35 @@ CURDIR = os.getcwd()
 DEFAULT_MIGRATE_DIR = os.path.join(CURDIR, 'migrations')
 UNDEFINED = object()
 VOID = lambda m, d: None # noqa
-with open(os.path.join(os.path.abspath(os.path.dirname(__file__)), 'template.txt')) as t:
-    MIGRATE_TEMPLATE = t.read()
+TEMPLATE_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'template.txt')
+MANIFEST_NAME = 'manifest.txt'
+MANIFEST_HEADER = '# peewee_migrate manifest: name sha256 [depends,...]\n'
+# manifests with declarations of migrations (older ones have none)
+MANIFEST_DECLARED_HEADER = \
+    '# peewee_migrate manifest: name sha256 [depends,...] [replaces=...] [depends=...]\n'
+
+# module-level names of migrations which are read without exec (see `declared`)
+DECLARED_NAMES = ('replaces', 'depends')
+
+# declared is {'replaces': [...], 'depends': [...]} of migration, None when it is unknown
+ManifestEntry = collections.namedtuple(
+    'ManifestEntry', ('name', 'sha256', 'depends', 'declared'), defaults=(None,))
+
+# progress of migrations run: operation is None when migration is done
+Progress = collections.namedtuple('Progress', ('migration', 'num', 'total', 'operation'))
+
+
+@lru_cache()
+def get_template():
+    """Read migration template on first use."""
+    with open(TEMPLATE_PATH) as t:
+        return t.read()
+
+
+def __getattr__(name):
+    if name == 'MIGRATE_TEMPLATE':  # backward compatibility
+        return get_template()
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
 
 
 class BaseRouter(object):
@@ -29,7 +60,13 @@ class BaseRouter(object):
     """Abstract base class for router."""
 
     def __init__(self, database, migrate_table='migratehistory', ignore=None,
-                 schema=None, logger=LOGGER):
+                 schema=None, logger=LOGGER, journal=None):
+        """Initialize the router.
+
+        :param journal: Journal completed operations to resume failed migrations
+            (enabled for MySQL by default, its DDL isn't transactional, and for
+            migrations with concurrent operations).
+        """
         self.database = database
         self.migrate_table = migrate_table
         self.schema = schema
@@ -38,14 +75,73 @@ class BaseRouter(object):
         if not isinstance(self.database, (pw.Database, pw.Proxy)):
             raise RuntimeError('Invalid database: %s' % database)
 
+        if journal is None:
+            database = database.obj if isinstance(database, pw.Proxy) else database
+            journal = isinstance(database, pw.MySQLDatabase)
+        self.journal = journal
+
     @cached_property
     def model(self) -> typing.Type[MigrateHistory]:
         """Initialize and cache MigrationHistory model."""
-        MigrateHistory._meta.database = self.database
-        MigrateHistory._meta.table_name = self.migrate_table
-        MigrateHistory._meta.schema = self.schema
-        MigrateHistory.create_table(True)
-        return MigrateHistory
+        model = self.history
+        if model.table_exists():
+            self.upgrade_history()
+        else:
+            model.create_table()
+        return model
+
+    @cached_property
+    def journal_model(self) -> typing.Type[MigrateJournal]:
+        """Initialize and cache journal of operations (next to history table)."""
+        model = table_model(MigrateJournal, self.database, self.migrate_table + '_journal',
+                            self.schema, ('name', 'operation'))
+        model.create_table(True)
+        return model
+
+    def upgrade_history(self):
+        """Upgrade history table created by older versions.
+
+        Unique index on names is added, duplicated records (concurrent runs before
+        the index) are removed. Column of durations is added.
+        Return True when the table is upgraded.
+        """
+        model = self.history
+        table = model._meta.table_name
+        upgraded = False
+        if not any(index.unique and index.columns == ['name']
+                   for index in self.database.get_indexes(table, self.schema)):
+            duplicates = (model
+                          .select(model.name, pw.fn.MIN(model.id).alias('first'))
+                          .group_by(model.name)
+                          .having(pw.fn.COUNT(model.id) > 1)
+                          .tuples())
+            with self.database.atomic():
+                for name, first in list(duplicates):
+                    model.delete().where(model.name == name, model.id != first).execute()
+                model._schema.create_indexes(safe=False)
+            self.logger.info('History table %s is upgraded: unique names', table)
+            upgraded = True
+
+        columns = {column.name for column in self.database.get_columns(table, self.schema)}
+        if model.duration.column_name not in columns:
+            ctx = self.database.get_sql_context()
+            ctx.literal('ALTER TABLE ').sql(model._meta.entity).literal(' ADD COLUMN ')
+            ctx.sql(model.duration.ddl(ctx))
+            self.database.execute_sql(*ctx.query())
+            self.logger.info('History table %s is upgraded: durations', table)
+            upgraded = True
+
+        return upgraded
+
+    @cached_property
+    def history(self) -> typing.Type[MigrateHistory]:
+        """Get MigrationHistory model of the router's table (table isn't created).
+
+        Every router has its own model, so routers of different databases (schemas)
+        don't affect each other.
+        """
+        return table_model(MigrateHistory, self.database, self.migrate_table, self.schema,
+                           ('name',))
 
     @property
     def todo(self):
@@ -60,22 +156,130 @@ class BaseRouter(object):
     def diff(self):
         """Calculate difference between fs and db."""
         done = set(self.done)
-        return [name for name in self.todo if name not in done]
+        checkpoints = self.checkpoints
+
+        def applied(name):
+            return name in done or done.issuperset(checkpoints.get(name) or [name])
+
+        graph = self.dependencies(self.resolve(self.todo, done))
+        pending = [name for name in graph if not applied(name)]
+        for name in pending:
+            missing = [dep for dep in graph[name] if dep not in graph and not applied(dep)]
+            if missing:
+                raise RuntimeError('Migration %s depends on unknown %s' % (name, missing))
+
+        return toposort({name: [d for d in graph[name] if d in pending] for name in pending})
+
+    def heads(self):
+        """Find migrations which no other migration depends on."""
+        return graph_heads(self.dependencies(self.resolve(self.todo, [])))
+
+    def is_up_to_date(self):
+        """Check all migrations are applied without history replay.
+
+        Heads of migrations graph are looked up with one query (the last migration
+        for linear history). Migrations aren't executed, only the ones which
+        declare ``depends`` or ``replaces`` are parsed. History table isn't created
+        when it doesn't exist.
+        """
+        heads = self.heads()
+        if not heads:
+            return True
+
+        model = self.history
+        try:
+            with self.database.atomic():
+                applied = {m.name for m in model.select(model.name).where(model.name.in_(heads))}
+        except pw.DatabaseError:
+            return False
+
+        if applied.issuperset(heads):
+            return True
+
+        # checkpoints are applied without records when replaced migrations are applied
+        return not self.diff
 
     @cached_property
     def migrator(self):
         """Create migrator and setup it with fake migrations."""
-        migrator = Migrator(self.database, self.schema)
-        for name in self.done:
-            self.run_one(name, migrator)
-        return migrator
+        done = self.done
+        return self.replay(self.resolve(done, done))
+
+    @cached_property
+    def declared(self):
+        """Read metadata declared by migrations: {name: {'replaces': [...], 'depends': [...]}}."""
+        return {name: self.read_declared(name) for name in self.todo}
+
+    def read_declared(self, name):
+        """Read `replaces` and `depends` of migration."""
+        return scope_declared(self.load(name))
 
-    def create(self, name='auto', auto=False):
+    @property
+    def checkpoints(self):
+        """Find checkpoint migrations: {name: [replaced migration names]}."""
+        return {name: meta['replaces'] for name, meta in self.declared.items()
+                if meta.get('replaces')}
+
+    def dependencies(self, names):
+        """Build migrations graph: {name: [dependencies]}.
+
+        Migrations could declare `depends = [...]` to start parallel branches,
+        others depend on all previous migrations (on current heads of the graph).
+        """
+        replaced = {name: checkpoint for checkpoint, replaces in self.checkpoints.items()
+                    for name in replaces if checkpoint in names}
+        graph, heads = collections.OrderedDict(), []
+        for name in names:
+            depends = self.declared.get(name, {}).get('depends')
+            if depends is None:
+                depends = heads
+            depends = [replaced.get(dep, dep) for dep in depends]
+            heads = [head for head in heads if head not in depends] + [name]
+            graph[name] = depends
+        return graph
+
+    def resolve(self, names, done):
+        """Put checkpoints in place of migrations which they replace.
+
+        Checkpoint is used when all of replaced migrations are applied (replay) or
+        none of them (fresh database), partially applied ones are finished as is.
+        """
+        done = set(done)
+        checkpoints = self.checkpoints
+        replaced = {}
+        for checkpoint, replaces in checkpoints.items():
+            applied = done.intersection(replaces)
+            if checkpoint in done or len(applied) in (0, len(replaces)):
+                replaced[checkpoint] = checkpoint
+                replaced.update((name, checkpoint) for name in replaces)
+
+        resolved, seen = [], set()
+        for name in names:
+            # replaced migrations are contiguous, checkpoint takes place of the first one
+            checkpoint = replaced.get(name)
+            if checkpoint is None:
+                if name not in checkpoints:
+                    resolved.append(name)
+            elif checkpoint not in seen:
+                seen.add(checkpoint)
+                resolved.append(checkpoint)
+        return resolved
+
+    def create(self, name='auto', auto=False, advise=False, stats=False, renames=None,
+               confirm_rename=None):
         """Create a migration.
         :param auto: Python module path to scan for models.
+        :param advise: Add indexes for foreign keys which have no supporting index
+            (once, they are kept by next migrations).
+        :param stats: Annotate costly operations with table sizes from database statistics.
+        :param renames: {'old_table': 'new_table', 'table.old_field': 'new_field'} renames.
+        :param confirm_rename: confirm_rename(old, new) to accept detected renames.
         """
         migrate = rollback = ''
         if auto:
+            import pkgutil
+            from peewee_migrate.auto import add_index, drop_index, unindexed_foreign_keys
+
             # Need to append the CURDIR to the path for import to work.
             sys.path.append(CURDIR)
             try:
@@ -91,15 +295,39 @@ class BaseRouter(object):
             if self.ignore:
                 models = [m for m in models if m._meta.name not in self.ignore]
 
-            for migration in self.diff:
-                self.run_one(migration, self.migrator, fake=True)
+            self.replay(self.diff, self.migrator)
+
+            sizes = None
+            if stats:
+                sizes = Catalog.from_database(self.database).table_sizes(self.schema)
+
+            migrate = compile_migrations(self.migrator, models, sizes=sizes, renames=renames,
+                                         confirm=confirm_rename, advise=advise)
+            rollback = migrate and compile_inverse(self.migrator, migrate)
+            if migrate and rollback is None:
+                # inverse is unknown, restore state to compare models
+                self.__dict__.pop('migrator', None)
+                self.replay(self.diff, self.migrator)
+                rollback = compile_migrations(self.migrator, models, reverse=True, sizes=sizes,
+                                              advise=advise)
+
+            if advise:
+                # indexes advised by previous migrations are in the state
+                advice = unindexed_foreign_keys(models, self.migrator.orm.values())
+                for model, field in advice:
+                    self.logger.warning(
+                        'Add index for foreign key %s.%s (set index=True on the field '
+                        'to keep models in sync)', model._meta.table_name, field.name)
+                if advice:
+                    migrate = (migrate or '') + compile_changes([
+                        add_index(model, field.name, False) for model, field in advice])
+                    rollback = compile_changes([
+                        drop_index(model, field.name) for model, field in reversed(advice)
+                    ]) + (rollback or '')
 
-            migrate = compile_migrations(self.migrator, models)
             if not migrate:
                 return self.logger.warn('No changes found.')
 
-            rollback = compile_migrations(self.migrator, models, reverse=True)
-
         self.logger.info('Creating migration "%s"', name)
         name = self.compile(name, migrate, rollback)
         self.logger.info('Migration has been created as "%s"', name)
@@ -126,23 +354,149 @@ class BaseRouter(object):
         """Clear migrations."""
         self.model.delete().execute()
 
-    def compile(self, name, migrate='', rollback='', num=None):
+    def check(self, schemas=None):
+        """Compare live database schema with the state of applied migrations.
+
+        History is replayed once and all schemas are introspected in one pass,
+        so many tenant schemas sharing the migrations are checked cheaply.
+
+        :param schemas: Schemas to check (router's schema by default).
+        :return: {schema: [Drift]} for schemas which differ.
+        """
+        from peewee_migrate.auto import diff_schema
+
+        models = list(self.migrator.orm.values())
+        ignore = [self.migrate_table, self.migrate_table + '_journal']
+        if self.ignore:
+            models = [m for m in models if m._meta.name not in self.ignore]
+            ignore += self.ignore
+
+        catalog = Catalog.from_database(self.database)
+        result = {}
+        for schema, tables in catalog.introspect(schemas or [self.schema]).items():
+            drift = diff_schema(models, tables, self.database, ignore=ignore)
+            if drift:
+                result[schema] = drift
+        return result
+
+    def advise(self, live=False):
+        """Find foreign keys which are not covered by leading column of any index.
+
+        :param live: Inspect live database instead of the state of applied migrations.
+        :return: [(table_name, column_name), ...]
+        """
+        from peewee_migrate.auto import unindexed_foreign_keys, unindexed_foreign_key_columns
+
+        if live:
+            catalog = Catalog.from_database(self.database)
+            tables = catalog.introspect([self.schema])[self.schema]
+            advice = unindexed_foreign_key_columns(tables)
+        else:
+            advice = [
+                (model._meta.table_name, field.column_name)
+                for model, field in unindexed_foreign_keys(self.migrator.orm.values())
+            ]
+
+        for table, column in advice:
+            self.logger.warning('Foreign key %s.%s has no supporting index', table, column)
+        return advice
+
+    def squash(self, name='squashed', start=None, end=None):
+        """Create checkpoint migration which replaces migrations from start to end.
+
+        History isn't touched: the checkpoint is replayed (or run on fresh databases)
+        instead of the replaced migrations. Only schema changes are squashed, data
+        migrations (`sql`, `python`) of the range aren't repeated by the checkpoint.
+        """
+        checkpoints = self.checkpoints
+        replaced = {name for names in checkpoints.values() for name in names}
+        names = [name for name in self.todo if name not in checkpoints]
+        if start is None:
+            start = next((name for name in names if name not in replaced), None)
+        if end is None:
+            end = names[-1] if names else None
+        if start not in names or end not in names:
+            raise RuntimeError('Unknown migrations range: %s..%s' % (start, end))
+
+        head, tail = names.index(start), names.index(end) + 1
+        replaces = names[head:tail]
+        if not replaces or replaced.intersection(replaces):
+            raise RuntimeError('Migrations %s..%s are already squashed or empty' % (start, end))
+
+        before = self.replay(names[:head])
+        after = self.replay(names[:tail])
+
+        migrate = compile_migrations(before, after.orm.values())
+        rollback = compile_migrations(before, after.orm.values(), reverse=True)
+        self.logger.info('Squash migrations %s..%s into "%s"', start, end, name)
+        name = self.compile(name, migrate or '', rollback or '', replaces=replaces)
+        self.logger.info('Migrations have been squashed into "%s"', name)
+        return name
+
+    def compile(self, name, migrate='', rollback='', num=None, replaces=None):
         raise NotImplementedError
 
-    def read(self, name):
+    def load(self, name):
+        """Load migration namespace: migrate, rollback and replaces."""
         raise NotImplementedError
 
-    def run_one(self, name, migrator, fake=True, downgrade=False, force=False):
-        """Run/emulate a migration with given name."""
+    def read(self, name):
+        """Read migrate and rollback functions of migration."""
+        scope = self.load(name)
+        return scope.get('migrate', VOID), scope.get('rollback', VOID)
+
+    def replay(self, names, migrator=None, visit=None):
+        """Emulate migrations to restore schema state (queries are faked once for all).
+
+        :param visit: Callable which gets name and operations of every migration.
+        """
+        migrator = migrator or Migrator(self.database, self.schema)
+        with fake_queries(self.database):
+            for name in names:
+                try:
+                    migrate, _ = self.read(name)
+                    migrate(migrator, self.database, fake=True)
+                except Exception:
+                    self.logger.exception('Migration failed: %s', name)
+                    raise
+                if visit:
+                    visit(name, migrator.migration.ops)
+                migrator.clean()
+        return migrator
+
+    def invert(self, name):
+        """Derive rollback of applied migration from its operations.
+
+        Migration is emulated in state before it to record inverse operations.
+        Return VOID when migration has operations which couldn't be reverted (sql, python).
+        """
+        done = [migration for migration in self.done if migration != name]
+        before = self.replay(self.resolve(done, done))
+        migrate, _ = self.read(name)
+        with fake_queries(self.database):
+            migrate(before, self.database, fake=True)
+
+        try:
+            revert = before.revert()
+        except ValueError:
+            self.logger.warning('Migration %s has no rollback, nothing is reverted', name)
+            return VOID
+
+        self.logger.info('Rollback %s with inverse operations', name)
+        return lambda migrator, database, **kwargs: revert(migrator)
+
+    def run_one(self, name, migrator, fake=True, downgrade=False, force=False, progress=None):
+        """Run/emulate a migration with given name.
+
+        :param progress: Callable which gets description of every operation before it runs.
+        """
         try:
             migrate, rollback = self.read(name)
+            if downgrade and rollback is VOID:
+                rollback = self.invert(name)
             if fake:
-                cursor_mock = mock.Mock()
-                cursor_mock.fetch_one.return_value = None
-                with mock.patch('peewee.Model.select'):
-                    with mock.patch('peewee.Database.execute_sql',
-                                    return_value=cursor_mock):
-                        migrate(migrator, self.database, fake=fake)
+                with fake_queries(self.database):
+                    migrate(migrator, self.database, fake=fake)
 
                 if force:
                     self.model.create(name=name)
@@ -154,25 +508,122 @@ class BaseRouter(object):
             with self.database.transaction():
                 if not downgrade:
                     self.logger.info('Migrate "%s"', name)
+                    started = time.monotonic()
                     migrate(migrator, self.database, fake=fake)
-                    migrator.run()
-                    self.model.create(name=name)
+                    # concurrent operations are applied outside of the transaction
+                    if self.journal or migrator.migration.workers > 1:
+                        self.run_journaled(name, migrator, progress)
+                    else:
+                        migrator.run(progress)
+                    self.model.create(name=name, duration=time.monotonic() - started)
                 else:
                     self.logger.info('Rolling back %s', name)
                     rollback(migrator, self.database, fake=fake)
-                    migrator.run()
+                    migrator.run(progress)
                     self.model.delete().where(self.model.name == name).execute()
 
                 self.logger.info('Done %s', name)
 
         except Exception:
             self.database.rollback()
+            migrator.clean()
             operation = 'Migration' if not downgrade else 'Rollback'
             self.logger.exception('%s failed: %s', operation, name)
             raise
 
-    def run(self, name=None, fake=False):
-        """Run migrations."""
+    def run_journaled(self, name, migrator, progress=None):
+        """Run operations of migration, skip operations completed by a failed run.
+
+        Completed operations are committed with their journal entries, so rollback
+        of a failed migration keeps them (DDL of MySQL and concurrent operations are
+        applied anyway). Migrations which run in a transaction of the caller are
+        committed by the caller.
+        """
+        journal = self.journal_model
+        completed = {
+            entry.operation for entry in journal.select().where(journal.name == name)}
+        if completed:
+            self.logger.warning(
+                'Resume migration %s: %d operations are completed', name, len(completed))
+
+        def done(num):
+            journal.create(name=name, operation=num)
+            # concurrent operations are journaled by workers in autocommit mode,
+            # transaction of the caller isn't committed
+            if self.database.transaction_depth() == 1:
+                self.database.top_transaction().commit()
+
+        if migrator.migration.workers > 1 and self.database.transaction_depth() == 1:
+            # workers write to the journal created by the transaction
+            self.database.top_transaction().commit()
+
+        migrator.run(progress, skip=completed, done=done)
+        journal.delete().where(journal.name == name).execute()
+
+    def estimate(self, names=None):
+        """Estimate duration of pending migrations without applying them.
+
+        Operations are emulated and classified (metadata only, index build, table
+        rewrite, full scan), costs are based on table sizes from catalog statistics
+        and calibrated by recorded durations of applied migrations.
+
+        :param names: Migrations to estimate, pending ones by default.
+        :return: [MigrationEstimate]
+        """
+        from peewee_migrate.estimate import (
+            MigrationEstimate, calibration, estimate_operations, total_seconds)
+
+        sizes = Catalog.from_database(self.database).table_sizes(self.schema)
+        model = self.model
+        durations = dict(model.select(model.name, model.duration)
+                         .where(model.duration.is_null(False)).tuples())
+
+        applied, pending = {}, collections.OrderedDict()
+
+        def visit(target):
+            return lambda name, ops: target.__setitem__(
+                name, estimate_operations(ops, self.database, sizes))
+
+        done = self.done
+        migrator = self.replay(self.resolve(done, done), visit=visit(applied))
+        self.replay(self.diff if names is None else names, migrator, visit=visit(pending))
+
+        factor = calibration(applied, durations)
+        return [
+            MigrationEstimate(name, total_seconds(operations) * factor, [
+                op._replace(seconds=op.seconds and op.seconds * factor) for op in operations
+            ]) for name, operations in pending.items()
+        ]
+
+    def lock(self):
+        """Get cross-process lock of the router's migrations."""
+        from peewee_migrate.lock import Lock
+
+        name = '.'.join(filter(None, [self.schema, self.migrate_table]))
+        return Lock.from_database(self.database, name)
+
+    def run(self, name=None, fake=False, workers=1, progress=None, lock=False, preflight=None,
+            preflight_timeout=None, monitor=None):
+        """Run migrations.
+
+        :param name: Run migrations up to the given one (with its dependencies).
+        :param workers: Apply independent branches concurrently on separate connections.
+        :param progress: Callable which gets `Progress` before every operation and
+            after every migration.
+        :param lock: Apply migrations by one process at once, others wait for the lock
+            and find nothing to migrate with one query (history isn't replayed by them).
+        :param preflight: Check long transactions hold locks on tables of migrations
+            before they run: 'report', 'wait' or 'refuse' (see `preflight`).
+        :param monitor: Report progress of long operations (index builds, rewrites)
+            while they run: True to log it, callable which gets `OperationProgress`
+            or `Monitor`.
+        """
+        if lock:
+            with self.lock():
+                return self.run(name, fake=fake, workers=workers, progress=progress,
+                                preflight=preflight, preflight_timeout=preflight_timeout,
+                                monitor=monitor)
+
         self.logger.info('Starting migrations')
 
         done = []
@@ -181,22 +632,133 @@ class BaseRouter(object):
             self.logger.info('There is nothing to migrate')
             return done
 
+        graph = self.dependencies(diff)
+        if name in graph:
+            graph = ancestors(graph, name)
+
+        if preflight and not fake:
+            self.preflight(toposort(graph), preflight, preflight_timeout)
+
         migrator = self.migrator
-        for mname in diff:
-            self.run_one(mname, migrator, fake=fake, force=fake)
-            done.append(mname)
-            if name and name == mname:
-                break
+        if monitor and not fake:
+            from peewee_migrate.monitor import Monitor
+
+            if not isinstance(monitor, Monitor):
+                monitor = Monitor.from_database(
+                    self.database, callback=monitor if callable(monitor) else None)
+            migrator.monitor = monitor
+
+        try:
+            if workers > 1 and not fake:
+                return self.run_parallel(graph, migrator, workers, progress)
+
+            for num, mname in enumerate(toposort(graph), 1):
+                self.run_one(mname, migrator, fake=fake, force=fake,
+                             progress=progress_callback(progress, mname, num, len(graph)))
+                done.append(mname)
+                if progress:
+                    progress(Progress(mname, num, len(graph), None))
+        finally:
+            migrator.monitor = None
+
+        return done
+
+    def preflight(self, names=None, mode='report', timeout=None):
+        """Find long transactions which hold locks on tables of migrations.
+
+        DDL would wait for them and application queries would queue behind it.
+        Operations are emulated to collect their tables (any table for sql, python).
+
+        :param names: Migrations to check, pending ones by default.
+        :param mode: 'report' logs conflicts, 'refuse' raises RuntimeError,
+            'wait' waits for them (`timeout` seconds, forever by default) and refuses after.
+        :return: [Conflict]
+        """
+        from peewee_migrate.migrator import is_session_operation, operation_tables
+        from peewee_migrate.preflight import Preflight
+
+        tables = set()
+
+        def visit(name, ops):
+            nonlocal tables
+            for op in ops:
+                if tables is None or is_session_operation(op):
+                    continue
+                touched = operation_tables(op)
+                tables = None if touched is None else tables | touched
+
+        done = self.done
+        migrator = self.replay(self.resolve(done, done))
+        self.replay(self.diff if names is None else names, migrator, visit)
+
+        check = Preflight.from_database(self.database, self.schema)
+        conflicts = check.conflicts(tables)
+        if conflicts and mode == 'wait':
+            self.logger.warning('Wait for %d transactions which lock tables of migrations',
+                                len({conflict.pid for conflict in conflicts}))
+            conflicts = check.wait(tables, timeout)
+
+        for conflict in conflicts:
+            self.logger.warning(
+                'Transaction %s (%s, %.0fs) holds %s on %s: %s', conflict.pid, conflict.state,
+                conflict.age or 0, conflict.mode, conflict.table, conflict.query)
+
+        if conflicts and mode in ('refuse', 'wait'):
+            raise RuntimeError('Tables of migrations are locked by transactions: %s' % ', '.join(
+                sorted({str(conflict.pid) for conflict in conflicts})))
+        return conflicts
+
+    def run_parallel(self, graph, migrator, workers, progress=None):
+        """Run migrations graph, independent migrations are run in threads."""
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        def run_one(name, num):
+            branch = Migrator(self.database, self.schema)
+            branch.orm = migrator.orm
+            branch.monitor = migrator.monitor
+            try:
+                self.run_one(name, branch, fake=False,
+                             progress=progress_callback(progress, name, num, len(graph)))
+            finally:
+                self.database.close()
+
+        done, running = [], {}
+        waiting = collections.OrderedDict((n, set(d).intersection(graph)) for n, d in graph.items())
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while waiting or running:
+                for mname in [n for n, deps in waiting.items() if not deps]:
+                    del waiting[mname]
+                    num = len(graph) - len(waiting)
+                    running[executor.submit(run_one, mname, num)] = mname
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    mname = running.pop(future)
+                    if future.exception():
+                        wait(running)
+                        raise future.exception()
+                    done.append(mname)
+                    if progress:
+                        progress(Progress(mname, len(done), len(graph), None))
+                    for deps in waiting.values():
+                        deps.discard(mname)
 
         return done
 
     def rollback(self, name):
+        """Rollback applied migration which no other applied migration depends on."""
         name = name.strip()
         done = self.done
         if not done:
             raise RuntimeError('No migrations are found.')
-        if name != done[-1]:
-            raise RuntimeError('Only last migration can be canceled.')
+
+        if name not in done:
+            raise RuntimeError('Migration %s is not applied.' % name)
+
+        graph = self.dependencies(self.resolve(self.todo, done))
+        dependents = [m for m in done if name in graph.get(m, ())]
+        if dependents:
+            raise RuntimeError('Migrations depend on %s: %s' % (name, ', '.join(dependents)))
 
         migrator = self.migrator
         self.run_one(name, migrator, False, True)
@@ -205,51 +767,254 @@ class BaseRouter(object):
 
 class Router(BaseRouter):
 
-    filemask = re.compile(r"[\d]{3}_[^\.]+\.py$")
+    filemask = re.compile(r"[\d]{3}_[^\.]+\.(py|json)$")
 
-    def __init__(self, database, migrate_dir=DEFAULT_MIGRATE_DIR, **kwargs):
+    def __init__(self, database, migrate_dir=DEFAULT_MIGRATE_DIR, verify_manifest=False,
+                 declarative=False, **kwargs):
+        """Initialize the router.
+
+        :param declarative: Write autogenerated migrations as JSON (see `declarative`).
+        """
         super(Router, self).__init__(database, **kwargs)
         self.migrate_dir = migrate_dir
+        self.verify_manifest = verify_manifest
+        self.declarative = declarative
 
     @property
     def todo(self):
+        """Read migrations from manifest, scan file system when there is no manifest."""
+        manifest = self.manifest
+        if manifest is None:
+            return self.scan()
+
+        if self.verify_manifest:
+            names = self.scan()
+            hashes = [(name, file_hash(self.path(name))) for name in names]
+            if [entry[:2] for entry in manifest] != hashes:
+                self.logger.warning('Manifest is outdated, use migrations from file system')
+                return names
+
+        return [entry.name for entry in manifest]
+
+    def scan(self):
         """Scan migrations in file system."""
         if not os.path.exists(self.migrate_dir):
             self.logger.warn('Migration directory: %s does not exist.', self.migrate_dir)
             os.makedirs(self.migrate_dir)
-        return sorted(f[:-3] for f in os.listdir(self.migrate_dir) if self.filemask.match(f))
+        return sorted(
+            os.path.splitext(f)[0] for f in os.listdir(self.migrate_dir) if self.filemask.match(f))
+
+    def path(self, name):
+        """Get path of migration file (python or declarative)."""
+        path = os.path.join(self.migrate_dir, name + '.py')
+        if os.path.exists(path):
+            return path
+
+        declarative = os.path.join(self.migrate_dir, name + '.json')
+        return declarative if os.path.exists(declarative) else path
+
+    def heads(self):
+        """Find migrations which no other migration depends on (from manifest if exists)."""
+        manifest = self.manifest
+        if manifest is None or self.verify_manifest:
+            return super(Router, self).heads()
+        return graph_heads({entry.name: entry.depends for entry in manifest})
+
+    @cached_property
+    def declared(self):
+        """Read declarations from trusted manifest, from migration files otherwise."""
+        manifest = self.manifest
+        declared = None
+        if manifest is not None and not self.verify_manifest:
+            declared = manifest_declared(manifest)
+        if declared is None:
+            declared = {name: self.read_declared(name) for name in self.todo}
+        return declared
+
+    @property
+    def manifest(self):
+        """Read manifest entries, None when migrations have no manifest."""
+        try:
+            with open(os.path.join(self.migrate_dir, MANIFEST_NAME)) as f:
+                return parse_manifest(f.read())
+        except FileNotFoundError:
+            return None
 
-    def compile(self, name, migrate='', rollback='', num=None):
+    def manifest_entries(self, names):
+        """Hash migration files and collect their dependencies.
+
+        Declarations are read from the files, the outdated manifest isn't used.
+        """
+        declared = {name: self.read_declared(name) for name in names}
+        self.__dict__['declared'] = declared
+        try:
+            graph = self.dependencies(names)
+        finally:
+            self.__dict__.pop('declared', None)
+        return [
+            ManifestEntry(name, file_hash(self.path(name)), tuple(graph[name]), declared[name])
+            for name in names
+        ]
+
+    def compile(self, name, migrate='', rollback='', num=None, replaces=None):
         """Create a migration."""
+        self.__dict__.pop('declared', None)
+        manifest = self.manifest
         if num is None:
-            num = len(self.todo)
+            trusted = manifest is not None and not self.verify_manifest
+            num = len(manifest) if trusted else len(self.todo)
 
         name = '{:03}_'.format(num + 1) + name
-        filename = name + '.py'
+        source = None
+        if self.declarative and migrate and migrate.strip():
+            from peewee_migrate import declarative
+
+            try:
+                source = declarative.dumps(migrate, rollback, replaces)
+            except (ValueError, SyntaxError) as exc:
+                self.logger.warning('Migration %s is written as python: %s', name, exc)
+
+        filename = name + ('.json' if source else '.py')
         path = os.path.join(self.migrate_dir, filename)
         with open(path, 'w') as f:
-            f.write(MIGRATE_TEMPLATE.format(migrate=migrate, rollback=rollback, name=filename))
+            f.write(source or get_template().format(
+                migrate=migrate, rollback=rollback, name=filename,
+                replaces=format_replaces(replaces)))
+
+        if manifest is not None:
+            depends = tuple(graph_heads({entry.name: entry.depends for entry in manifest}))
+            declared = {'replaces': list(replaces)} if replaces else {}
+            manifest.append(ManifestEntry(name, file_hash(path), depends, declared))
+            self.write_manifest(manifest)
 
         return name
 
-    def read(self, name):
-        """Read migration from file."""
+    def source(self, name):
+        """Read path and code of migration file."""
         call_params = dict()
         if os.name == 'nt' and sys.version_info >= (3, 0):
             # if system is windows - force utf-8 encoding
             call_params['encoding'] = 'utf-8'
-        with open(os.path.join(self.migrate_dir, name + '.py'), **call_params) as f:
-            code = f.read()
-            scope = {}
-            exec_in(code, scope)
-            return scope.get('migrate', VOID), scope.get('rollback', VOID)
+        path = self.path(name)
+        with open(path, **call_params) as f:
+            return path, f.read()
+
+    def read_declared(self, name):
+        """Read `replaces` and `depends` of migration, literals are parsed without exec."""
+        path, code = self.source(name)
+        declared = parse_declared(code, path.endswith('.json'))
+        if declared is None:
+            return super(Router, self).read_declared(name)
+        return declared
+
+    def load(self, name):
+        """Read migration from file."""
+        path, code = self.source(name)
+        if path.endswith('.json'):
+            from peewee_migrate import declarative
+
+            return declarative.loads(code)
+
+        scope = {}
+        exec_in(code, scope)
+        return scope
 
     def clear(self):
         """Remove migrations from fs."""
         super(Router, self).clear()
+        self.__dict__.pop('declared', None)
         for name in self.todo:
-            filename = os.path.join(self.migrate_dir, name + '.py')
-            os.remove(filename)
+            os.remove(self.path(name))
+
+        if self.manifest is not None:
+            self.write_manifest([])
+
+    def write_manifest(self, entries=None):
+        """Write manifest of migrations (scan file system by default).
+
+        Router trusts the manifest and doesn't list the directory, packaged
+        migrations are read by `ResourceRouter` with the manifest.
+        """
+        if entries is None:
+            entries = self.manifest_entries(self.scan())
+
+        with open(os.path.join(self.migrate_dir, MANIFEST_NAME), 'w') as f:
+            f.write(format_manifest(entries))
+
+        self.__dict__.pop('declared', None)
+        return [entry.name for entry in entries]
+
+
+class ResourceRouter(BaseRouter):
+
+    """Read migrations from package resources (zipapps, wheels, zipped eggs).
+
+    Migrations are listed from the manifest written by `Router.write_manifest`,
+    so the archive isn't scanned. Packages without manifest are scanned once.
+    """
+
+    filemask = Router.filemask
+
+    def __init__(self, database, migrate_package='migrations', **kwargs):
+        super(ResourceRouter, self).__init__(database, **kwargs)
+        self.migrate_package = migrate_package
+
+    @cached_property
+    def resources(self):
+        from importlib.resources import files
+
+        return files(self.migrate_package)
+
+    @cached_property
+    def manifest(self):
+        """Read manifest entries, None when the package has no manifest."""
+        manifest = self.resources / MANIFEST_NAME
+        if manifest.is_file():
+            return parse_manifest(manifest.read_text(encoding='utf-8'))
+        return None
+
+    @cached_property
+    def todo(self):
+        """Read migrations from manifest or scan the package."""
+        if self.manifest is not None:
+            return [entry.name for entry in self.manifest]
+
+        return sorted(
+            os.path.splitext(res.name)[0] for res in self.resources.iterdir()
+            if self.filemask.match(res.name))
+
+    @cached_property
+    def declared(self):
+        """Read declarations from manifest, from migration resources otherwise."""
+        declared = self.manifest and manifest_declared(self.manifest)
+        if declared is None:
+            declared = {name: self.read_declared(name) for name in self.todo}
+        return declared
+
+    def read_declared(self, name):
+        """Read `replaces` and `depends` of migration, literals are parsed without exec."""
+        resource = self.resources / (name + '.py')
+        declarative = not resource.is_file()
+        if declarative:
+            resource = self.resources / (name + '.json')
+        declared = parse_declared(resource.read_text(encoding='utf-8'), declarative)
+        if declared is None:
+            return super(ResourceRouter, self).read_declared(name)
+        return declared
+
+    def load(self, name):
+        """Read migration from package resource."""
+        resource = self.resources / (name + '.py')
+        if not resource.is_file():
+            from peewee_migrate import declarative
+
+            return declarative.loads(
+                (self.resources / (name + '.json')).read_text(encoding='utf-8'))
+
+        code = resource.read_text(encoding='utf-8')
+        scope = {}
+        exec_in(code, scope)
+        return scope
 
 
 class ModuleRouter(BaseRouter):
@@ -262,9 +1027,302 @@ class ModuleRouter(BaseRouter):
 
         self.migrate_module = migrate_module
 
-    def read(self, name):
-        mod = getattr(self.migrate_module, name)
-        return getattr(mod, 'migrate', VOID), getattr(mod, 'rollback', VOID)
+    @property
+    def todo(self):
+        """Scan migrations in package."""
+        import pkgutil
+
+        path = getattr(self.migrate_module, '__path__', [])
+        return sorted(
+            name for _, name, _ in pkgutil.iter_modules(path)
+            if Router.filemask.match(name + '.py'))
+
+    def load(self, name):
+        mod = getattr(self.migrate_module, name, None)
+        if mod is None:
+            mod = import_module('%s.%s' % (self.migrate_module.__name__, name))
+        return vars(mod)
+
+
+def progress_callback(progress, name, num, total):
+    """Wrap progress callback to get descriptions of migration operations."""
+    if progress is None:
+        return None
+    return lambda operation: progress(Progress(name, num, total, operation))
+
+
+def toposort(graph):
+    """Order graph {name: [dependencies]}, dependencies go first, order is kept otherwise."""
+    import heapq
+
+    order = {name: num for num, name in enumerate(graph)}
+    waiting = {name: set(deps) for name, deps in graph.items()}
+    dependents = collections.defaultdict(list)
+    for name, deps in graph.items():
+        for dep in deps:
+            dependents[dep].append(name)
+
+    ready = [(order[name], name) for name, deps in waiting.items() if not deps]
+    heapq.heapify(ready)
+    result = []
+    while ready:
+        _, name = heapq.heappop(ready)
+        result.append(name)
+        for dependent in dependents[name]:
+            waiting[dependent].discard(name)
+            if not waiting[dependent]:
+                heapq.heappush(ready, (order[dependent], dependent))
+
+    if len(result) != len(graph):
+        raise RuntimeError('Migrations have circular dependencies: %s' % ', '.join(
+            name for name in graph if name not in result))
+    return result
+
+
+class FakeCursor(object):
+
+    """Cursor of emulated migrations: queries aren't sent, raw results are empty."""
+
+    description = None
+    lastrowid = None
+    rowcount = 0
+
+    def execute(self, sql, params=None):
+        pass
+
+    def fetchone(self):
+        return None
+
+    def fetchmany(self, size=None):
+        return []
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class FakeConnection(object):
+
+    """Connection of emulated migrations."""
+
+    def cursor(self, *args, **kwargs):
+        return FakeCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def is_faked(database):
+    """Check queries of the current thread to the database are faked."""
+    if isinstance(database, pw.Proxy):
+        database = database.obj
+    return database is not None and isinstance(getattr(database._state, 'conn', None),
+                                               FakeConnection)
+
+
+class FakeSelect(object):
+
+    """Patch `Model.select` to return mocks for faked databases.
+
+    Migrations could query models (e.g. `Person.get(...)`) and use the results,
+    they get permissive mocks when emulated. Queries of other threads and
+    databases aren't changed. The patch is kept while any queries are faked.
+    """
+
+    lock = threading.Lock()
+    users = 0
+    saved = {}
+
+    @classmethod
+    def patch(cls):
+        with cls.lock:
+            if not cls.users:
+                cls.saved['select'] = pw.Model.__dict__['select']
+                original = cls.saved['select'].__func__
+
+                def select(model, *fields):
+                    if is_faked(model._meta.database):
+                        from unittest import mock
+
+                        return mock.MagicMock()
+                    return original(model, *fields)
+
+                pw.Model.select = classmethod(select)
+            cls.users += 1
+
+    @classmethod
+    def restore(cls):
+        with cls.lock:
+            cls.users -= 1
+            if not cls.users:
+                pw.Model.select = cls.saved.pop('select')
+
+
+@contextmanager
+def fake_queries(database):
+    """Don't send queries of emulated migrations to database.
+
+    Connection of the current thread is replaced for a while, other threads
+    (and routers) keep using the database. Model selects get mocks (see `FakeSelect`).
+    """
+    if isinstance(database, pw.Proxy):
+        database = database.obj
+
+    state = database._state
+    saved = dict(vars(state))
+    state.set_connection(FakeConnection())
+    FakeSelect.patch()
+    try:
+        yield
+    finally:
+        FakeSelect.restore()
+        vars(state).update(saved)
+
+
+def table_model(base, database, table_name, schema, unique):
+    """Bind model to the table, unique index is named by the table.
+
+    Peewee names indexes by model, but they should be unique per schema for
+    routers with different tables in one database.
+    """
+    meta = type('Meta', (), {'database': database, 'table_name': table_name, 'schema': schema})
+    model = type(base.__name__, (base,), {'Meta': meta, '__module__': base.__module__})
+    model.add_index(model.index(*[model._meta.fields[name] for name in unique], unique=True,
+                                name='%s_%s' % (table_name, '_'.join(unique))))
+    return model
+
+
+def graph_heads(graph):
+    """Find names of graph {name: [dependencies]} which nothing depends on."""
+    depends = {dep for deps in graph.values() for dep in deps}
+    return [name for name in graph if name not in depends]
+
+
+def ancestors(graph, name):
+    """Cut graph {name: [dependencies]} to the migration and its dependencies."""
+    keep, stack = set(), [name]
+    while stack:
+        current = stack.pop()
+        if current not in keep:
+            keep.add(current)
+            stack.extend(dep for dep in graph[current] if dep in graph)
+    return collections.OrderedDict((n, deps) for n, deps in graph.items() if n in keep)
+
+
+def parse_manifest(text):
+    """Parse manifest lines into [ManifestEntry]."""
+    entries = []
+    declares = False
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#'):
+            declares = declares or line + '\n' == MANIFEST_DECLARED_HEADER
+            continue
+        if not line:
+            continue
+        name, sha256, *params = line.split()
+        depends = [param for param in params if '=' not in param] + ['']
+        declared = None
+        if declares:
+            declared = {
+                key: list(filter(None, value.split(',')))
+                for key, value in (param.split('=', 1) for param in params if '=' in param)}
+        entries.append(ManifestEntry(
+            name, sha256, tuple(filter(None, depends[0].split(','))), declared))
+    return entries
+
+
+def manifest_declared(entries):
+    """Get declarations of migrations from manifest, None when it has no declarations."""
+    if any(entry.declared is None for entry in entries):
+        return None
+    return {entry.name: entry.declared for entry in entries}
+
+
+def scope_declared(scope):
+    """Collect `replaces` and `depends` of migration namespace."""
+    return {key: list(scope[key]) for key in DECLARED_NAMES if scope.get(key) is not None}
+
+
+def parse_declared(code, declarative=False):
+    """Read `replaces` and `depends` of migration code without exec.
+
+    Python migrations declare them with literals at module level, None is
+    returned when they are computed (the migration should be executed).
+    Most migrations declare nothing, their code isn't parsed.
+    """
+    if not any(name in code for name in DECLARED_NAMES):
+        return {}
+
+    if declarative:
+        import json
+
+        return scope_declared(json.loads(code))
+
+    values = {}
+    for node in ast.parse(code).body:
+        if isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names = [t.id for t in targets if isinstance(t, ast.Name)]
+            if not set(names) & set(DECLARED_NAMES):
+                continue
+            if len(names) != len(targets) or node.value is None:
+                return None
+            try:
+                value = ast.literal_eval(node.value)
+            except (ValueError, TypeError):
+                return None
+            values.update(dict.fromkeys(names, value))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if node.name in DECLARED_NAMES:
+                return None
+        elif not isinstance(node, (ast.Expr, ast.Pass)):
+            bound = {n.id for n in ast.walk(node)
+                     if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store)}
+            bound.update(alias.asname or alias.name.split('.')[0]
+                         for alias in getattr(node, 'names', ()) if not isinstance(alias, str))
+            if bound & set(DECLARED_NAMES):
+                return None
+
+    try:
+        return scope_declared(values)
+    except TypeError:
+        return None
+
+
+def format_replaces(replaces):
+    """Format list of migrations replaced by checkpoint."""
+    if not replaces:
+        return ''
+    names = ''.join('    %r,\n' % name for name in replaces)
+    return '\n# Checkpoint: replayed (or run) instead of migrations below\nreplaces = [\n%s]\n' % names
+
+
+def format_manifest(entries):
+    """Format [ManifestEntry] into manifest lines."""
+    declares = all(entry.declared is not None for entry in entries)
+    lines = []
+    for entry in entries:
+        params = [','.join(entry.depends)]
+        if declares:
+            params += ['%s=%s' % (key, ','.join(entry.declared[key]))
+                       for key in DECLARED_NAMES if key in entry.declared]
+        lines.append(' '.join(entry[:2] + tuple(filter(None, params))) + '\n')
+    return (MANIFEST_DECLARED_HEADER if declares else MANIFEST_HEADER) + ''.join(lines)
+
+
+def file_hash(path):
+    """Calculate sha256 of file."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
 
 def load_models(module):
@@ -276,6 +1334,8 @@ def load_models(module):
 
 
 def _import_submodules(package, passed=UNDEFINED):
+    import pkgutil
+
     if passed is UNDEFINED:
         passed = set()
 
@@ -305,15 +1365,45 @@ def _check_model(obj, models=None):
     return isinstance(obj, type) and issubclass(obj, pw.Model) and hasattr(obj, '_meta')
 
 
-def compile_migrations(migrator, models, reverse=False):
+def compile_migrations(migrator, models, reverse=False, sizes=None, renames=None, confirm=None,
+                       advise=False):
     """Compile migrations for given models."""
+    from peewee_migrate.auto import diff_many
+
     source = migrator.orm.values()
     if reverse:
         source, models = models, source
 
-    migrations = diff_many(models, source, migrator, reverse=reverse)
+    migrations = diff_many(models, source, migrator, reverse=reverse, sizes=sizes,
+                           renames=renames, confirm=confirm, advise=advise)
     if not migrations:
         return False
 
-    migrations = NEWLINE + NEWLINE.join('\n\n'.join(migrations).split('\n'))
-    return CLEAN_RE.sub('\n', migrations)
+    return compile_changes(migrations)
+
+
+def compile_inverse(migrator, migrate):
+    """Compile rollback from inverse operations of migration code, None if they are unknown.
+
+    Migration is emulated by the migrator, so its state is moved forward.
+    """
+    from peewee_migrate.auto import inverse_to_code
+
+    scope = {}
+    exec_in(get_template().format(migrate=migrate, rollback='', name='', replaces=''), scope)
+    with fake_queries(migrator.database):
+        scope['migrate'](migrator, migrator.database, fake=True)
+
+    inverse = list(reversed(migrator.migration.inverse))
+    migrator.clean()
+    if None in inverse:
+        return None
+    return compile_changes([inverse_to_code(call, migrator=migrator) for call in inverse])
+
+
+def compile_changes(changes):
+    """Indent and join changes into migration code."""
+    from peewee_migrate.auto import NEWLINE
+
+    changes = NEWLINE + NEWLINE.join('\n\n'.join(changes).split('\n'))
+    return CLEAN_RE.sub('\n', changes)
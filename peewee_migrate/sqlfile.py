@@ -0,0 +1,215 @@
+"""Stream SQL files (dumps, seeds) into database.
+
+Files are read line by line and split into statements, so their size doesn't
+matter. Quotes, dollar quotes and comments are respected. Data blocks of
+``COPY ... FROM STDIN`` (pg_dump format) are streamed with COPY protocol.
+"""
+import collections
+import re
+
+from playhouse.migrate import MySQLDatabase, PostgresqlDatabase
+
+from peewee_migrate import LOGGER
+
+
+COPY_RE = re.compile(r'COPY\b.*\bFROM\s+STDIN\b', re.I | re.S)
+LEADING_COMMENTS_RE = re.compile(r'^(?:\s+|--[^\n]*(?:\n|$)|/\*.*?\*/)*', re.S)
+TOKEN_RE = re.compile(r"""(;)|(')|(")|(--)|(/\*)|(\$(?:[A-Za-z_][A-Za-z_0-9]*)?\$)""")
+E_PREFIX_RE = re.compile(r'(?:^|[^\w$])[Ee]$')
+ESCAPED_STRING_END_RE = re.compile(r"\\.|'", re.S)
+COMMENT_RE = re.compile(r'/\*|\*/')
+
+# statement followed by rows which are consumed before the next statement
+Copy = collections.namedtuple('Copy', ('statement', 'rows'))
+
+
+def split_statements(lines, backslash_escapes=False):
+    """Split SQL lines into statements, `Copy` is yielded for COPY FROM STDIN.
+
+    :param backslash_escapes: Backslashes escape quotes in all strings (MySQL),
+        only in E'' strings otherwise.
+    """
+    lines = iter(lines)
+    parts, code = [], False
+    quote = None  # "'", "E'", '"', '/*' or dollar tag
+    depth = 0  # of nested block comments
+
+    for line in lines:
+        pos = 0
+        while pos < len(line):
+            if quote is None:
+                match = TOKEN_RE.search(line, pos)
+                start = match.start() if match else len(line)
+                code = code or bool(line[pos:start].strip())
+                parts.append(line[pos:start])
+                if not match:
+                    break
+
+                semicolon, single, double, dash, block, dollar = match.groups()
+                if semicolon:
+                    pos = match.end()
+                    statement, has_code = ''.join(parts).strip(), code
+                    parts, code = [], False
+                    if not has_code:
+                        continue
+                    if COPY_RE.match(LEADING_COMMENTS_RE.sub('', statement, 1)):
+                        rows = copy_rows(lines)
+                        yield Copy(statement, rows)
+                        for _ in rows:  # not consumed rows
+                            pass
+                        break
+                    yield statement
+                    continue
+
+                if dash:
+                    parts.append(line[start:])
+                    break
+
+                pos = match.end()
+                parts.append(line[start:pos])
+                if dollar and start and (line[start - 1].isalnum() or line[start - 1] in '_$'):
+                    continue  # part of identifier
+
+                code = code or not block
+                depth = 1
+                quote = double or block or dollar
+                if single:
+                    escaped = backslash_escapes or E_PREFIX_RE.search(line[max(0, start - 2):start])
+                    quote = "E'" if escaped else "'"
+                continue
+
+            if quote == '/*':
+                match = COMMENT_RE.search(line, pos)
+                end = match.end() if match else -1
+                if match:
+                    depth += 1 if match.group() == '/*' else -1
+            elif quote == "E'":
+                match = ESCAPED_STRING_END_RE.search(line, pos)
+                while match and match.group() != "'":
+                    match = ESCAPED_STRING_END_RE.search(line, match.end())
+                end = match.end() if match else -1
+            else:
+                end = line.find(quote, pos)
+                end = end + len(quote) if end >= 0 else -1
+
+            if end < 0:
+                parts.append(line[pos:])
+                break
+            parts.append(line[pos:end])
+            pos = end
+            if quote != '/*' or not depth:
+                quote = None
+
+    statement = ''.join(parts).strip()
+    if code:
+        yield statement
+
+
+def copy_rows(lines):
+    """Yield data rows of COPY FROM STDIN until the end marker."""
+    for line in lines:
+        if line.rstrip('\r\n') == '\\.':
+            return
+        yield line
+
+
+class LinesReader(object):
+
+    """File-like object which reads lines of iterable (for psycopg2 copy_expert)."""
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.count = 0
+
+    def read(self, size=-1):
+        chunk, length = [], 0
+        for line in self.lines:
+            self.count += 1
+            chunk.append(line)
+            length += len(line)
+            if 0 < size <= length:
+                break
+        return ''.join(chunk)
+
+    def readline(self, size=-1):
+        return self.read(1)
+
+
+class SqlFile(object):
+
+    """Execute SQL file by batches of statements.
+
+    Batches are sent with one query for PostgreSQL, statements are sent one by one
+    for other databases.
+    """
+
+    def __init__(self, database, path, batch=1000, encoding='utf-8', progress=None):
+        self.database = database
+        self.path = path
+        self.batch = batch
+        self.encoding = encoding
+        self.progress = progress
+        self.statements = self.rows = 0
+
+    def __call__(self):
+        self.statements = self.rows = 0
+        pending = []
+        cursor = self.database.cursor()
+        with open(self.path, encoding=self.encoding) as lines:
+            backslash_escapes = isinstance(self.database, MySQLDatabase)
+            for statement in split_statements(lines, backslash_escapes):
+                if isinstance(statement, Copy):
+                    self.execute(cursor, pending)
+                    pending = []
+                    self.rows += self.copy(cursor, statement)
+                    self.statements += 1
+                    self.report()
+                    continue
+
+                pending.append(statement)
+                if len(pending) >= self.batch:
+                    self.execute(cursor, pending)
+                    pending = []
+
+            self.execute(cursor, pending)
+
+        LOGGER.info('sql_file %s: %d statements, %d rows copied',
+                    self.path, self.statements, self.rows)
+
+    def execute(self, cursor, statements):
+        """Execute batch of statements."""
+        if not statements:
+            return
+
+        if isinstance(self.database, PostgresqlDatabase):
+            # statements could end with line comments
+            cursor.execute('\n;\n'.join(statements))
+        else:
+            for statement in statements:
+                cursor.execute(statement)
+
+        self.statements += len(statements)
+        self.report()
+
+    def copy(self, cursor, copy):
+        """Stream rows of COPY FROM STDIN, return number of rows."""
+        if not isinstance(self.database, PostgresqlDatabase):
+            raise ValueError('COPY FROM STDIN is supported by PostgreSQL only: %s' % self.path)
+
+        if hasattr(cursor, 'copy_expert'):  # psycopg2
+            reader = LinesReader(copy.rows)
+            cursor.copy_expert(copy.statement, reader)
+            return reader.count
+
+        count = 0
+        with cursor.copy(copy.statement) as stream:  # psycopg3
+            for row in copy.rows:
+                stream.write(row)
+                count += 1
+        return count
+
+    def report(self):
+        LOGGER.debug('sql_file %s: %d statements, %d rows copied',
+                     self.path, self.statements, self.rows)
+        if self.progress:
+            self.progress(self.statements, self.rows)
@@ -0,0 +1,38 @@
+""" Tests for asyncio router. """
+import asyncio
+
+import peewee as pw
+
+
+def test_async_router(tmpdir, migrations_dir):
+    from peewee_migrate import AsyncRouter, Router
+
+    database = pw.SqliteDatabase(str(tmpdir.join('test.db')))
+    router = Router(database, migrate_dir=str(migrations_dir))
+
+    async def migrate():
+        ticks = []
+
+        async def heartbeat():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0)
+
+        task = asyncio.ensure_future(heartbeat())
+        async with AsyncRouter(router) as arouter:
+            assert await arouter.diff() == router.todo
+            events = [event async for event in arouter.progress('003_tespy')]
+            assert await arouter.run() == ['004_test_insert']
+            await arouter.rollback('004_test_insert')
+            done = await arouter.done()
+        task.cancel()
+        return events, done, ticks
+
+    events, done, ticks = asyncio.run(migrate())
+    assert done == ['001_test', '002_test', '003_tespy']
+    assert ticks
+
+    assert [e for e in events if e.operation is None] == [
+        ('001_test', 1, 3, None), ('002_test', 2, 3, None), ('003_tespy', 3, 3, None)]
+    assert ('001_test', 1, 3, 'create_table person') in events
+    assert ('002_test', 2, 3, 'add_column tag') in events
@@ -23,6 +23,7 @@ def test_auto():
     code = model_to_code(Person_)
     assert code
     assert 'table_name = "person"' in code
+    assert 'birthday = pw.DateField(default=dt.datetime.now)' in code
 
     changes = diff_many(models, [], migrator=migrator)
     assert len(changes) == 2
@@ -35,10 +36,10 @@ def test_auto():
 
     changes = diff_one(Person, Person_, migrator=migrator)
     assert len(changes) == 6
-    assert "on_delete='CASCADE'" in changes[0]
-    assert "backref='persons'" in changes[0]
-    assert changes[-3] == "migrator.drop_not_null('person', 'last_name')"
-    assert changes[-2] == "migrator.drop_index('person', 'last_name')"
+    assert changes[0] == "migrator.drop_index('person', 'last_name')"
+    assert "on_delete='CASCADE'" in changes[1]
+    assert "backref='persons'" in changes[1]
+    assert changes[-2] == "migrator.drop_not_null('person', 'last_name')"
     assert changes[-1] == "migrator.add_index('person', 'last_name', unique=True)"
 
     migrator.drop_index('person', 'email')
@@ -95,3 +96,291 @@ def test_auto_multi_column_index():
     code = model_to_code(Object)
     assert code
     assert "indexes = [(('first_name', 'last_name'), True)]" in code
+
+
+def test_auto_meta_indexes():
+    from peewee_migrate.auto import diff_one, model_to_code
+
+    class Object(pw.Model):
+        first_name = pw.CharField()
+        last_name = pw.CharField()
+        active = pw.BooleanField()
+
+        class Meta:
+            table_name = 'object'
+
+    class Object_(pw.Model):
+        first_name = pw.CharField()
+        last_name = pw.CharField()
+        active = pw.BooleanField()
+
+        class Meta:
+            table_name = 'object'
+            indexes = (
+                (('first_name', 'last_name'), True),
+            )
+
+    Object_.add_index(
+        pw.fn.lower(Object_.last_name), where=(Object_.active == True),  # noqa
+        name='object_lower_last_name')
+
+    changes = diff_one(Object_, Object)
+    assert changes == [
+        "migrator.add_index('object', 'first_name', 'last_name', unique=True)",
+        "migrator.add_index('object', 'lower(\"last_name\")', unique=False, "
+        "where='(\"active\" = TRUE)', name='object_lower_last_name')",
+    ]
+
+    changes = diff_one(Object, Object_)
+    assert changes == [
+        "migrator.drop_index('object', 'first_name', 'last_name')",
+        "migrator.drop_index('object', 'lower(\"last_name\")', name='object_lower_last_name')",
+    ]
+
+    assert not diff_one(Object_, Object_)
+
+    code = model_to_code(Object_)
+    assert "indexes = [(('first_name', 'last_name'), True)]" in code
+    assert ("migrator.add_index('object', 'lower(\"last_name\")', unique=False, "
+            "where='(\"active\" = TRUE)', name='object_lower_last_name')") in code
+
+    # raw SQL indexes couldn't be diffed
+    Object_._meta.indexes.append(pw.SQL('CREATE INDEX object_raw ON object (active)'))
+    from unittest import mock
+
+    with mock.patch('peewee_migrate.auto.LOGGER.warning') as warning:
+        assert not diff_one(Object_, Object_)
+    assert 'CREATE INDEX object_raw ON object (active)' in warning.call_args[0]
+
+
+def test_auto_unindexed_foreign_keys():
+    from peewee_migrate.auto import unindexed_foreign_keys, field_to_code
+
+    class Author(pw.Model):
+        name = pw.CharField()
+
+    class Book(pw.Model):
+        author = pw.ForeignKeyField(Author, index=False)
+        editor = pw.ForeignKeyField(Author, index=False)
+        reviewer = pw.ForeignKeyField(Author, index=False)
+        title = pw.CharField()
+
+        class Meta:
+            indexes = (
+                (('editor', 'title'), False),
+                (('title', 'reviewer'), False),
+            )
+
+    assert [(m, f.name) for m, f in unindexed_foreign_keys([Author, Book])] == [
+        (Book, 'author'), (Book, 'reviewer'),
+    ]
+    assert 'index=False' in field_to_code(Book.author)
+
+
+def test_auto_annotate_with_table_sizes():
+    from peewee_migrate.auto import diff_one
+
+    class Object(pw.Model):
+        name = pw.CharField(null=True)
+
+        class Meta:
+            table_name = 'object'
+
+    class Object_(pw.Model):
+        name = pw.CharField(max_length=100)
+
+        class Meta:
+            table_name = 'object'
+
+    changes = diff_one(Object_, Object, sizes={'object': 2000000})
+    assert changes == [
+        "# WARNING: object: ~2,000,000 rows, change_fields may rewrite the table "
+        "under exclusive lock\nmigrator.change_fields('object', name=pw.CharField(max_length=100))",
+        "# WARNING: object: ~2,000,000 rows, add_not_null scans the table "
+        "under exclusive lock\nmigrator.add_not_null('object', 'name')",
+    ]
+
+    changes = diff_one(Object_, Object, sizes={'object': 10})
+    assert changes[1].startswith('# object: ~10 rows, add_not_null')
+
+    assert diff_one(Object_, Object, sizes={}) == diff_one(Object_, Object)
+
+
+def test_auto_inverse():
+    from peewee_migrate import Migrator
+    from peewee_migrate.router import compile_inverse, compile_migrations
+
+    database = pw.SqliteDatabase(':memory:')
+
+    class Person(pw.Model):
+        name = pw.CharField(index=True)
+        old = pw.IntegerField(null=True)
+
+        class Meta:
+            table_name = 'person'
+
+    migrator = Migrator(database)
+    compile_inverse(migrator, compile_migrations(migrator, [Person]))
+
+    class Person(pw.Model):  # noqa
+        name = pw.CharField(unique=True, null=True)
+        email = pw.CharField(null=True)
+
+        class Meta:
+            table_name = 'person'
+
+    migrate = compile_migrations(migrator, [Person])
+    rollback = compile_inverse(migrator, migrate)
+    assert "migrator.add_fields('person', old=pw.IntegerField(null=True))" in rollback
+    assert "migrator.remove_fields('person', 'email')" in rollback
+    assert "migrator.add_not_null('person', 'name')" in rollback
+    assert "migrator.add_index('person', 'name', unique=False)" in rollback
+    assert compile_migrations(migrator, [Person]) is False
+
+    assert compile_inverse(migrator, "    migrator.sql('SELECT 1')") is None
+
+    # constraints of changed fields are restored
+    migrator.add_fields('person', visits=pw.IntegerField(constraints=[pw.SQL('DEFAULT 0')]))
+    migrator.clean()
+    rollback = compile_inverse(
+        migrator, "    migrator.change_fields('person', visits=pw.BigIntegerField())")
+    assert rollback.strip() == (
+        "migrator.change_fields('person', "
+        "visits=pw.IntegerField(constraints=[SQL(\"DEFAULT 0\")]))")
+
+
+def test_auto_renames():
+    from peewee_migrate import Migrator
+    from peewee_migrate.auto import diff_many
+    from peewee_migrate.router import compile_inverse, compile_migrations
+
+    class Person(pw.Model):
+        name = pw.CharField()
+        age = pw.IntegerField(null=True)
+
+    class Pet(pw.Model):
+        owner = pw.ForeignKeyField(Person)
+
+    class Person_(pw.Model):
+        full_name = pw.CharField()
+        age = pw.IntegerField(null=True)
+
+        class Meta:
+            table_name = 'person'
+
+    # not detected without hints or confirmation
+    changes = diff_many([Person_], [Person])
+    assert len(changes) == 2
+    assert changes[0].startswith('migrator.add_fields(')
+    assert changes[1] == "migrator.remove_fields('person', 'name')"
+
+    asked = []
+    changes = diff_many([Person_], [Person], confirm=lambda *args: asked.append(args) or True)
+    assert asked == [('person.name', 'person.full_name')]
+    assert changes == ["migrator.rename_field('person', 'name', 'full_name')"]
+    assert diff_many([Person_], [Person], renames={'person.name': 'full_name'}) == changes
+    assert len(diff_many([Person_], [Person], confirm=lambda *args: False)) == 2
+
+    # changed definitions are renamed by hints only
+    class Person_(pw.Model):  # noqa
+        full_name = pw.CharField(null=True)
+        age = pw.IntegerField(null=True)
+
+        class Meta:
+            table_name = 'person'
+
+    assert len(diff_many([Person_], [Person], confirm=lambda *args: True)) == 2
+    assert diff_many([Person_], [Person], renames={'person.name': 'full_name'}) == [
+        "migrator.rename_field('person', 'name', 'full_name')",
+        "migrator.drop_not_null('person', 'full_name')",
+    ]
+
+    # renamed table
+    class People(pw.Model):
+        name = pw.CharField()
+        age = pw.IntegerField(null=True)
+
+    changes = diff_many([People], [Person], confirm=lambda *args: True)
+    assert changes == ["migrator.rename_table('person', 'people')"]
+    assert diff_many([People], [Person], renames={'person': 'people'}) == changes
+    assert diff_many([People, Pet], [Person, Pet], renames={'person': 'people'}) == changes
+
+    # renamed class of the same table
+    class Human(pw.Model):
+        name = pw.CharField()
+        age = pw.IntegerField(null=True)
+
+        class Meta:
+            table_name = 'person'
+
+    assert diff_many([Human], [Person]) == []
+
+    migrator = Migrator(pw.SqliteDatabase(':memory:'))
+    compile_inverse(migrator, compile_migrations(migrator, [Person]))
+    migrate = compile_migrations(migrator, [People], renames={'person': 'people'})
+    rollback = compile_inverse(migrator, migrate)
+    assert rollback.strip() == "migrator.rename_table('people', 'person')"
+
+
+def test_auto_renames_indexes():
+    from peewee_migrate import Migrator
+    from peewee_migrate.router import compile_migrations, get_template
+    from peewee_migrate.utils import exec_in
+
+    database = pw.SqliteDatabase(':memory:')
+    migrator = Migrator(database)
+
+    def migrate(models, **kwargs):
+        code = compile_migrations(migrator, models, **kwargs)
+        scope = {}
+        exec_in(get_template().format(migrate=code, rollback='', name='', replaces=''), scope)
+        scope['migrate'](migrator, database)
+        rollback = migrator.revert()
+        migrator.run()
+        return code, rollback
+
+    def indexes(table):
+        return sorted(index.name for index in database.get_indexes(table))
+
+    class Book(pw.Model):
+        title = pw.CharField(index=True)
+        pages = pw.IntegerField()
+
+        class Meta:
+            indexes = ((('title', 'pages'), True),)
+
+    migrate([Book])
+
+    # indexes are dropped by old names of columns before renames
+    class Book(pw.Model):  # noqa
+        title = pw.CharField(index=True)
+        num_pages = pw.IntegerField()
+
+        class Meta:
+            indexes = ((('title', 'num_pages'), True),)
+
+    code, rollback = migrate([Book], renames={'book.pages': 'num_pages'})
+    assert code.index("drop_index('book', 'title', 'pages')") < code.index('rename_field')
+    assert indexes('book') == ['book_title', 'book_title_num_pages']
+
+    rollback(migrator)
+    migrator.run()
+    assert indexes('book') == ['book_title', 'book_title_pages']
+
+    migrate([Book], renames={'book.pages': 'num_pages'})
+
+    # and by old name of table
+    class Volume(pw.Model):
+        title = pw.CharField()
+        num_pages = pw.IntegerField()
+
+        class Meta:
+            indexes = ((('title', 'num_pages'), True),)
+
+    code, rollback = migrate([Volume], renames={'book': 'volume'})
+    assert code.index("drop_index('book', 'title')") < code.index('rename_table')
+    assert indexes('volume') == ['book_title_num_pages']
+
+    rollback(migrator)
+    migrator.run()
+    assert indexes('book') == ['book_title', 'book_title_num_pages']
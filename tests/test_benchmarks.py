@@ -0,0 +1,14 @@
+""" Smoke test the benchmark suite on a tiny history. """
+from benchmarks import bench
+
+
+def test_benchmarks(tmpdir):
+    output = tmpdir.join('bench.txt')
+    bench.main(['--sizes', '5', '--output', str(output)])
+
+    lines = output.readlines()
+    assert len(lines) == len(bench.BENCHMARKS)
+
+    results = bench.run([8], ['replay', 'diff'])
+    assert [r['bench'] for r in results] == ['replay', 'diff']
+    assert all(r['size'] == 8 and r['seconds'] >= 0 and r['peak_kb'] for r in results)
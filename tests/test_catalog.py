@@ -0,0 +1,45 @@
+import peewee as pw
+
+from peewee_migrate.catalog import Catalog
+
+
+def create_tables(database):
+    class Author(pw.Model):
+        name = pw.CharField(index=True)
+
+        class Meta:
+            table_name = 'author'
+
+    class Book(pw.Model):
+        author = pw.ForeignKeyField(Author)
+        title = pw.CharField(null=True)
+
+        class Meta:
+            table_name = 'book'
+
+    with database.bind_ctx([Author, Book]):
+        database.create_tables([Author, Book])
+        Author.insert_many([{'name': str(i)} for i in range(10)]).execute()
+
+    database.execute_sql('ANALYZE')
+
+
+def test_catalog_introspect(database):
+    create_tables(database)
+
+    tables = Catalog.from_database(database).introspect()[None]
+    author, book = tables['author'], tables['book']
+
+    assert list(book.columns) == ['id', 'author_id', 'title']
+    assert book.columns['title'].null
+    assert book.columns['id'].primary_key
+    assert [(i.columns, i.unique) for i in author.indexes] == [(['name'], False)]
+    assert [(fk.column, fk.dest_table, fk.dest_column) for fk in book.foreign_keys] == [
+        ('author_id', 'author', 'id')]
+
+
+def test_catalog_table_sizes(database):
+    create_tables(database)
+
+    sizes = Catalog.from_database(database).table_sizes()
+    assert sizes['author'] == 10
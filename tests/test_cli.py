@@ -101,7 +101,7 @@ def test_rollback(dir_option, db_option, router, migrations):
 
     result = runner.invoke(cli, ['rollback', dir_option, db_option, '005_test'])
     assert result.exception
-    assert result.exception.args[0] == 'Only last migration can be canceled.'
+    assert result.exception.args[0] == 'Migration 005_test is not applied.'
     assert router().done == migrations[:-4]
 
 
@@ -114,3 +114,67 @@ def test_fake(dir_option, db_option, migrations_str, router):
     # assert not router().done
 
 
+
+
+def test_check(dir_option, db_option, db_url, migrations):
+    runner.invoke(cli, ['migrate', dir_option, db_option])
+    result = runner.invoke(cli, ['check', dir_option, db_option])
+    assert result.exit_code == 0
+    assert 'No schema drift found.' in result.output
+
+    from playhouse.db_url import connect
+    connect(db_url).execute_sql('CREATE TABLE extra (id INTEGER)')
+
+    result = runner.invoke(cli, ['check', dir_option, db_option])
+    assert result.exit_code == 1
+    assert 'table extra.extra: exists expected False, got True' in result.output
+
+
+def test_manifest(dir_option, migrations, tmpdir):
+    result = runner.invoke(cli, ['manifest', dir_option])
+    assert result.exit_code == 0
+    lines = tmpdir.join('manifest.txt').readlines()
+    assert [line.split()[0] for line in lines[1:]] == migrations
+    assert lines[2].split()[2] == migrations[0]
+
+
+def test_squash(dir_option, db_option, migrations, tmpdir):
+    result = runner.invoke(cli, ['squash', dir_option, db_option, '--end', migrations[-2]])
+    assert result.exit_code == 0
+    assert 'Checkpoint created: 006_squashed' in result.output
+
+    result = runner.invoke(cli, ['squash', dir_option, db_option, '--start', migrations[0]])
+    assert result.exit_code == 1
+
+
+def test_migrate_check(dir_option, db_option, migrations):
+    result = runner.invoke(cli, ['migrate', dir_option, db_option, '--check'])
+    assert result.exit_code == 1
+
+    runner.invoke(cli, ['migrate', dir_option, db_option])
+    result = runner.invoke(cli, ['migrate', dir_option, db_option, '--check'])
+    assert result.exit_code == 0
+    assert 'up to date' in result.output
+
+
+def test_migrate_estimate(dir_option, db_option, migrations):
+    result = runner.invoke(cli, ['migrate', dir_option, db_option, '--estimate'])
+    assert result.exit_code == 0
+    assert '001_test: ~' in result.output
+    assert 'Total: ~' in result.output
+
+    runner.invoke(cli, ['migrate', dir_option, db_option])
+    result = runner.invoke(cli, ['migrate', dir_option, db_option, '--estimate'])
+    assert 'up to date' in result.output
+
+
+def test_makemigrations_declarative(dir_option, db_option, tmpdir):
+    result = runner.invoke(cli, [
+        'makemigrations', dir_option, db_option, '--auto-source=tests.test_autodiscover.some_folder_one',
+        '--declarative', '--name=initial'])
+    assert result.exit_code == 0
+    assert tmpdir.join('001_initial.json').check()
+
+    result = runner.invoke(cli, ['migrate', dir_option, db_option])
+    assert result.exit_code == 0
+    assert 'Migrations completed: 001_initial' in result.output
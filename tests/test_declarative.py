@@ -0,0 +1,46 @@
+import decimal
+
+import peewee as pw
+import pytest
+
+
+def test_declarative():
+    from peewee_migrate import Migrator
+    from peewee_migrate.declarative import code_to_data, dumps, loads
+    from peewee_migrate.router import compile_migrations
+
+    class Person(pw.Model):
+        name = pw.CharField(index=True, default='x')
+        money = pw.DecimalField(null=True)
+
+        class Meta:
+            indexes = ((('name', 'money'), True),)
+
+    class Pet(pw.Model):
+        owner = pw.ForeignKeyField(Person, on_delete='CASCADE', backref='pets')
+
+    migrator = Migrator(pw.SqliteDatabase(':memory:'))
+    migrate = compile_migrations(migrator, [Person, Pet])
+    rollback = compile_migrations(migrator, [Person, Pet], reverse=True)
+    scope = loads(dumps(migrate, rollback))
+
+    scope['migrate'](migrator, migrator.database)
+    person, pet = migrator.orm['person'], migrator.orm['pet']
+    assert list(person._meta.columns) == ['id', 'name', 'money']
+    assert person._meta.indexes == [(('name', 'money'), True)]
+    assert person.money.rounding == decimal.ROUND_HALF_EVEN
+    assert pet.owner.rel_model is person
+    assert pet.owner.on_delete == 'CASCADE'
+
+    migrator.run()
+    assert migrator.database.get_tables() == ['person', 'pet']
+
+    scope['rollback'](migrator, migrator.database)
+    migrator.run()
+    assert migrator.database.get_tables() == []
+
+    with pytest.raises(ValueError):
+        code_to_data("migrator.sql(open('schema.sql').read())")
+
+    with pytest.raises(ValueError):
+        code_to_data("for name in names:\n    migrator.remove_model(name)")
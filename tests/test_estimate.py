@@ -0,0 +1,50 @@
+import peewee as pw
+
+
+def test_estimate_operations():
+    from peewee_migrate import Migrator
+    from peewee_migrate.estimate import (
+        INDEX, METADATA, REWRITE, SCAN, calibration, estimate_operations, format_estimates,
+        MigrationEstimate)
+
+    database = pw.PostgresqlDatabase('postgres')
+
+    class Order(pw.Model):
+        number = pw.IntegerField()
+
+    migrator = Migrator(database)
+    migrator.create_model(Order)
+    migrator.add_fields(Order, note=pw.TextField(null=True), total=pw.IntegerField(default=0))
+    migrator.add_index(Order, 'number')
+    migrator.add_not_null(Order, 'number')
+    migrator.change_fields(Order, number=pw.BigIntegerField())
+    migrator.sql('VACUUM order')
+
+    operations = estimate_operations(migrator.migration.ops, database, {'order': 2000000})
+    assert [op.kind for op in operations] == [
+        METADATA, METADATA, REWRITE, INDEX, SCAN, REWRITE, None]
+    assert operations[0].seconds < operations[4].seconds < operations[3].seconds
+    assert operations[-1].seconds is None
+    assert operations[3].rows == 2000000
+
+    assert calibration({'001': operations}, {'001': 1000}) == 1.0  # unknown operations
+    assert calibration({'001': operations[3:4]}, {'001': 20}) == 20 / operations[3].seconds
+    assert calibration({'001': operations[:1]}, {'001': 20}) == 1.0  # too little work
+
+    output = format_estimates([MigrationEstimate('001_orders', 30, operations)])
+    assert '001_orders: ~30.0s' in output
+    assert 'add_index order: index build, ~2,000,000 rows, ~10.0s' in output
+    assert 'sql VACUUM order: unknown' in output
+    assert output.endswith('Total: ~30.0s (and unknown operations)')
+
+
+def test_router_estimate(router):
+    pending = router.diff
+    estimates = router.estimate()
+    assert [estimate.migration for estimate in estimates] == pending
+    assert all(estimate.seconds >= 0 for estimate in estimates)
+
+    router.run()
+    model = router.model
+    assert model.select().where(model.duration.is_null()).count() == 0
+    assert router.estimate() == []
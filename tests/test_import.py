@@ -0,0 +1,41 @@
+""" Guard import time of the package against heavy dependencies. """
+import subprocess
+import sys
+
+import pytest
+
+
+HEAVY_MODULES = [
+    'unittest.mock', 'pkgutil', 'playhouse.reflection', 'playhouse.db_url',
+    'peewee_migrate.auto',
+]
+
+
+def imported_modules(statement):
+    code = '%s; import sys; print(" ".join(sorted(sys.modules)))' % statement
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return set(output.decode().split())
+
+
+@pytest.mark.parametrize('statement', [
+    'import peewee_migrate',
+    'from peewee_migrate import MigrateHistory',
+    'from peewee_migrate import Router, Migrator',
+    'import peewee_migrate.cli',
+])
+def test_import_is_lazy(statement):
+    modules = imported_modules(statement)
+    assert not modules & set(HEAVY_MODULES)
+
+
+def test_import_time():
+    """Package import should cost about as much as peewee itself."""
+    def measure(statement):
+        code = 'import time; t = time.perf_counter(); %s; print(time.perf_counter() - t)'
+        return min(
+            float(subprocess.check_output([sys.executable, '-c', code % statement]))
+            for _ in range(3)
+        )
+
+    baseline = measure('import peewee, playhouse.migrate')
+    assert measure('from peewee_migrate import Router') < baseline * 2 + 0.05
@@ -0,0 +1,61 @@
+""" Tests for cross-process migrations lock. """
+import threading
+
+import peewee as pw
+import pytest
+
+from peewee_migrate.lock import Lock, PostgresqlLock, SqliteLock
+from tests.conftest import POSTGRES_DSN
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def databases(request, tmpdir):
+    if request.param == 'sqlite':
+        path = str(tmpdir.join('test.db'))
+        dbs = pw.SqliteDatabase(path), pw.SqliteDatabase(path)
+    else:
+        from playhouse.db_url import connect
+        dbs = connect(POSTGRES_DSN), connect(POSTGRES_DSN)
+
+    yield dbs
+    for db in dbs:
+        db.close()
+
+
+def test_lock(databases):
+    first, second = [Lock.from_database(db, 'test') for db in databases]
+    assert isinstance(first, (PostgresqlLock, SqliteLock))
+
+    with first:
+        assert not second.acquire(timeout=0.2)
+
+    assert second.acquire(timeout=0.2)
+    second.release()
+
+
+def test_lock_sqlite_memory():
+    lock = Lock.from_database(pw.SqliteDatabase(':memory:'))
+    assert lock.path is None
+    with lock:
+        pass
+
+
+def test_router_run_lock(tmpdir, migrations_dir):
+    from peewee_migrate.router import Router
+
+    path = str(tmpdir.join('test.db'))
+    leader = Router(pw.SqliteDatabase(path), migrate_dir=str(migrations_dir))
+    follower = Router(pw.SqliteDatabase(path), migrate_dir=str(migrations_dir))
+
+    result = {}
+    with leader.lock():
+        thread = threading.Thread(target=lambda: result.update(done=follower.run(lock=True)))
+        thread.start()
+        thread.join(0.3)
+        assert thread.is_alive()
+
+        assert leader.run() == leader.todo
+
+    thread.join()
+    assert result['done'] == []
+    assert 'migrator' not in follower.__dict__
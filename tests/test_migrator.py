@@ -84,6 +84,9 @@ def test_migrator_sqlite_common():
     assert Order._meta.indexes
     assert not Order.identifier.index
 
+    with pytest.raises(ValueError):
+        migrator.drop_index(Order, 'identifier', 'unknown')
+
     migrator.drop_index(Order, 'identifier', 'customer')
     migrator.run()
     assert not Order._meta.indexes
@@ -109,6 +112,33 @@ def test_migrator_sqlite_common():
     migrator.rename_table("new_name", "order")
     migrator.run()
 
+def test_migrator_partial_index():
+    from playhouse.db_url import connect
+
+    database = connect('sqlite:///:memory:')
+    migrator = Migrator(database)
+
+    @migrator.create_table
+    class User(pw.Model):
+        name = pw.CharField()
+        active = pw.BooleanField(default=True)
+
+    migrator.add_index(User, 'name', 'lower(name)', where='active = 1')
+    migrator.run()
+
+    index, = User._meta.indexes
+    assert isinstance(index, pw.ModelIndex)
+    assert index._name == 'user_name_lowername'
+    [(name, sql)] = [(i.name, i.sql) for i in database.get_indexes('user')]
+    assert name == 'user_name_lowername'
+    assert sql.endswith('WHERE active = 1')
+
+    migrator.drop_index(User, 'name', 'lower(name)')
+    migrator.run()
+    assert not User._meta.indexes
+    assert not database.get_indexes('user')
+
+
 @pytest.fixture()
 def patched_pg_db() -> Generator[PatchedPgDatabase, Any, None]:
 
@@ -195,3 +225,135 @@ def test_migrator_schema(patched_pg_db):
     migrator.run()
 
     assert patched_pg_db.queries[0] == 'SET search_path TO {}'.format(schema_name)
+
+
+def test_migrator_parallel(tmpdir):
+    from unittest import mock
+
+    from peewee_migrate.migrator import group_operations
+
+    database = pw.SqliteDatabase(str(tmpdir.join('test.db')))
+    migrator = Migrator(database)
+
+    for name in ('first', 'second', 'third'):
+        migrator.create_table(type(name.title(), (pw.Model,), {
+            'value': pw.IntegerField(),
+            'Meta': type('Meta', (), {'table_name': name}),
+        }))
+    migrator.run()
+
+    @migrator.create_table
+    class Fourth(pw.Model):
+        first = pw.ForeignKeyField(migrator.orm['first'])
+
+    migrator.parallel(2)
+    migrator.add_index('first', 'value')
+    migrator.add_index('second', 'value')
+    migrator.add_index('third', 'value')
+    migrator.sql('SELECT 1')
+    migrator.add_index('second', 'id', 'value')
+
+    stages = group_operations(migrator.migration.ops)
+    assert [[len(group) for group in stage] for stage in stages] == [[2, 1, 1], [1], [1]]
+
+    # sqlite serializes writes, operations are applied one by one
+    with mock.patch.object(migrator.migration, 'apply_concurrently') as apply_concurrently:
+        migrator.run()
+    assert not apply_concurrently.called
+    assert migrator.migration.workers == 1
+    assert database.get_tables() == ['first', 'fourth', 'second', 'third']
+    assert [i.name for i in database.get_indexes('second')] == [
+        'second_id_value', 'second_value']
+    assert [i.name for i in database.get_indexes('third')] == ['third_value']
+
+
+def test_split_statements():
+    from peewee_migrate.sqlfile import Copy, split_statements
+
+    sql = r"""-- header; with semicolon
+CREATE TABLE t (id int, s text); /* block ; /* nested ; */ still */
+INSERT INTO t VALUES (1, 'a;b''c'), (2, E'x\';y');
+CREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $body$ LANGUAGE sql;
+SELECT "we;ird" FROM t;
+COPY t (id, s) FROM stdin;
+1	x;y
+\.
+SELECT 2
+"""
+    statements = list(split_statements(sql.splitlines(True)))
+    assert statements[0] == '-- header; with semicolon\nCREATE TABLE t (id int, s text)'
+    assert statements[1].endswith("INSERT INTO t VALUES (1, 'a;b''c'), (2, E'x\\';y')")
+    assert statements[2] == 'CREATE FUNCTION f() RETURNS int AS $body$ SELECT 1; $body$ LANGUAGE sql'
+    assert statements[3] == 'SELECT "we;ird" FROM t'
+    assert isinstance(statements[4], Copy)
+    assert statements[5] == 'SELECT 2'
+
+    assert list(split_statements(['SELECT 1 -- trailing; comment\n', ';SELECT 2;'])) == [
+        'SELECT 1 -- trailing; comment', 'SELECT 2']
+    assert list(split_statements(["SELECT '\\'; SELECT 2;"])) == ["SELECT '\\'", 'SELECT 2']
+    assert list(split_statements(["SELECT '\\'; SELECT 2;"], backslash_escapes=True)) == [
+        "SELECT '\\'; SELECT 2;"]
+
+
+def test_migrator_sql_file(database, tmpdir):
+    path = tmpdir.join('seed.sql')
+    lines = ['CREATE TABLE seed (id integer, name text);']
+    lines += ["INSERT INTO seed VALUES (%d, 'name;%d') -- row %d" % (num, num, num) + '\n;'
+              for num in range(5)]
+    if isinstance(database, pw.PostgresqlDatabase):
+        lines += ['COPY seed (id, name) FROM stdin;', '5\tcopied', '6\tcopied', '\\.']
+    path.write('\n'.join(lines) + '\n')
+
+    progress = []
+    migrator = Migrator(database)
+    migrator.sql_file(str(path), batch=2, progress=lambda *args: progress.append(args))
+    migrator.run()
+
+    rows = 7 if isinstance(database, pw.PostgresqlDatabase) else 5
+    assert database.execute_sql('SELECT count(*) FROM seed').fetchone()[0] == rows
+    assert progress[:3] == [(2, 0), (4, 0), (6, 0)]
+    assert progress[-1] == ((7, 2) if rows == 7 else (6, 0))
+
+
+def test_migrator_operations_record_inverse(tmpdir):
+    """Every operation records its inverse call (None when it can't be reverted)."""
+    import inspect
+
+    database = pw.SqliteDatabase(':memory:')
+    migrator = Migrator(database)
+
+    class Order(pw.Model):
+        number = pw.CharField(null=True)
+        note = pw.CharField(null=True)
+
+    calls = [
+        ('create_table', (Order,), {}),
+        ('add_columns', ('order',), {'total': pw.IntegerField(null=True)}),
+        ('change_columns', ('order',), {'total': pw.BigIntegerField(null=True)}),
+        ('add_index', ('order', 'number'), {}),
+        ('drop_index', ('order', 'number'), {}),
+        ('add_not_null', ('order', 'number'), {}),
+        ('drop_not_null', ('order', 'number'), {}),
+        ('add_default', ('order', 'number', ''), {}),
+        ('rename_column', ('order', 'note', 'comment'), {}),
+        ('drop_columns', ('order', 'comment'), {}),
+        ('rename_table', ('order', 'orders'), {}),
+        ('sql', ('SELECT 1',), {}),
+        ('sql_file', (str(tmpdir.join('seed.sql')),), {}),
+        ('python', (print,), {}),
+        ('drop_table', ('orders',), {}),
+    ]
+    not_operations = {'run', 'parallel', 'invert', 'revert', 'clean', 'ops', 'migrator'}
+    methods = {  # aliases (add_fields, remove_model, ...) are the same functions
+        value.__name__ for name, value in vars(Migrator).items()
+        if not name.startswith('_') and name not in not_operations and inspect.isfunction(value)
+    }
+    assert methods == {name for name, _, _ in calls}
+
+    for name, args, kwargs in calls:
+        recorded = len(migrator.migration.inverse)
+        getattr(migrator, name)(*args, **kwargs)
+        assert len(migrator.migration.inverse) == recorded + 1, name
+
+    assert migrator.migration.inverse[calls.index(('add_default', ('order', 'number', ''), {}))] \
+        is None
@@ -0,0 +1,71 @@
+import peewee as pw
+
+
+def test_describe_progress():
+    from peewee_migrate.monitor import OperationProgress, describe_progress, estimate_eta
+
+    assert estimate_eta(25, 100, 10) == 30
+    assert estimate_eta(0, 100, 10) is None
+    assert estimate_eta(10, None, 10) is None
+
+    progress = OperationProgress('add_index orders', 'building index', 25, 100, 'blocks', 10, 30)
+    assert describe_progress(progress) == \
+        'building index, 25/100 blocks (25%), elapsed 10s, ETA 30s'
+    assert describe_progress(progress._replace(total=None, eta=None)) == \
+        'building index, 25 blocks, elapsed 10s'
+
+
+def test_monitor_sqlite():
+    from peewee_migrate import Migrator
+    from peewee_migrate.monitor import Monitor
+
+    database = pw.SqliteDatabase(':memory:')
+    database.execute_sql('CREATE TABLE orders (id INTEGER PRIMARY KEY, number INTEGER)')
+    database.execute_sql(
+        'WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 20000) '
+        'INSERT INTO orders (number) SELECT x FROM n')
+
+    reports = []
+    monitor = Monitor.from_database(database, callback=reports.append, interval=0)
+    monitor.steps = 1000
+
+    migrator = Migrator(database)
+    migrator.monitor = monitor
+    migrator.sql('CREATE INDEX orders_number ON orders (number)')
+    migrator.run()
+
+    assert reports
+    assert {(r.operation, r.phase, r.unit) for r in reports} == {
+        ('sql CREATE INDEX orders_number ON orders (number)', 'running', 'steps')}
+    assert reports[-1].done > reports[0].done
+
+
+def test_monitor_postgresql():
+    import playhouse.db_url
+
+    from peewee_migrate.monitor import PostgresqlMonitor
+    from tests.conftest import POSTGRES_DSN
+
+    database = playhouse.db_url.connect(POSTGRES_DSN)
+
+    class Monitor(PostgresqlMonitor):
+        def poll(self, session):
+            assert super(Monitor, self).poll(session) is None  # nothing is built
+            polled.append(session)
+            return 'building index', len(polled), 4, 'blocks'
+
+    polled, reports = [], []
+    monitor = Monitor(database, callback=reports.append, interval=0.01)
+    with monitor.watch('add_index orders'):
+        database.execute_sql('SELECT pg_sleep(0.1)')
+
+    pid = database.execute_sql('SELECT pg_backend_pid()').fetchone()[0]
+    assert set(polled) == {pid}
+    assert reports[0].done == 1 and reports[0].eta is not None
+    database.close()
+
+
+def test_router_monitor(router):
+    reports = []
+    assert router.run(monitor=reports.append) == router.todo
+    assert router.migrator.monitor is None
@@ -0,0 +1,59 @@
+import playhouse.db_url
+import peewee as pw
+import pytest
+
+from tests.conftest import POSTGRES_DSN
+
+
+@pytest.fixture()
+def locked():
+    """Table locked by transaction of other session."""
+    other = playhouse.db_url.connect(POSTGRES_DSN)
+    other.execute_sql('CREATE TABLE IF NOT EXISTS preflight_locked (id integer)')
+    other.execute_sql('BEGIN')
+    other.execute_sql('LOCK TABLE preflight_locked IN ACCESS SHARE MODE')
+    yield 'preflight_locked'
+    other.execute_sql('ROLLBACK')
+    other.execute_sql('DROP TABLE preflight_locked')
+    other.close()
+
+
+def test_preflight(locked):
+    from peewee_migrate.preflight import Preflight
+
+    database = playhouse.db_url.connect(POSTGRES_DSN)
+    preflight = Preflight.from_database(database, min_age=0)
+    conflicts = preflight.conflicts({locked, 'other'})
+    assert [(c.table, c.mode, c.state) for c in conflicts] == [
+        (locked, 'AccessShareLock', 'idle in transaction')]
+    assert [c.pid for c in preflight.conflicts(None)] == [conflicts[0].pid]
+    assert preflight.conflicts({'other'}) == []
+    assert Preflight.from_database(database).conflicts({locked}) == []  # young transaction
+
+    preflight.poll_interval = 0.01
+    assert len(preflight.wait({locked}, timeout=0.05)) == 1
+
+    assert Preflight.from_database(pw.SqliteDatabase(':memory:')).conflicts() == []
+
+
+def test_router_preflight(router, locked, monkeypatch, tmpdir):
+    from peewee_migrate.cli import get_router
+    from peewee_migrate.preflight import Preflight
+
+    assert router.preflight() == []
+    monkeypatch.setattr(Preflight, 'min_age', 0)
+    assert router.preflight(mode='refuse') == []  # other tables
+
+    # tables of raw sql are unknown, so any locked table conflicts
+    tmpdir.join('001_sql.py').write(
+        "def migrate(migrator, database, **kwargs):\n"
+        "    migrator.sql('UPDATE preflight_locked SET id = 1')\n")
+    router = get_router(str(tmpdir), router.database)
+    if isinstance(router.database, pw.SqliteDatabase):
+        assert router.preflight(mode='refuse') == []
+        return
+
+    assert len(router.preflight()) == 1
+    with pytest.raises(RuntimeError):
+        router.run(preflight='refuse')
+    assert router.done == []
@@ -3,15 +3,47 @@ import os
 
 from unittest import mock
 
+import pytest
+
 
 def test_router_run_already_applied_ok(router):
     router.run()
     assert router.diff == []
 
-    with mock.patch('peewee.Database.execute_sql') as execute_sql:
-        router.run_one('004_test_insert', router.migrator, fake=True)
+    Person = router.migrator.orm['person']
+    assert Person.select().count() == 1
+    router.run_one('004_test_insert', router.migrator, fake=True)
+    assert Person.select().count() == 1
+
+
+def test_router_fake_model_queries(database, tmpdir):
+    from peewee_migrate.router import Router
+
+    tmpdir.join('001_person.py').write(
+        "import peewee as pw\n"
+        "def migrate(migrator, database, **kwargs):\n"
+        "    @migrator.create_model\n"
+        "    class Person(pw.Model):\n"
+        "        email = pw.CharField()\n")
+    tmpdir.join('002_insert.py').write(
+        "def migrate(migrator, database, **kwargs):\n"
+        "    migrator.orm['person'].create(email='e@x')\n")
+    tmpdir.join('003_get.py').write(
+        "def migrate(migrator, database, **kwargs):\n"
+        "    Person = migrator.orm['person']\n"
+        "    person = Person.get(Person.email == 'e@x')\n"
+        "    migrator.python(lambda: Person.update(email='new@x')\n"
+        "                    .where(Person.id == person.id).execute())\n")
+
+    router = Router(database, migrate_dir=str(tmpdir))
+    assert router.run() == ['001_person', '002_insert', '003_get']
 
-    assert not execute_sql.called
+    # emulated queries get mocks
+    router = Router(database, migrate_dir=str(tmpdir))
+    Person = router.migrator.orm['person']
+    assert [p.email for p in Person.select()] == ['new@x']
+    router.run_one('003_get', router.migrator, fake=True)
+    assert Person.select().count() == 1
 
 
 def test_router_todo_diff_done(router, migrations_dir):
@@ -43,6 +75,17 @@ def test_router_rollback(router):
     assert router.diff == ['003_tespy', '004_test_insert']
     assert migrations.count() == 2
 
+    # migrations without rollback are reverted by inverse operations
+    router.rollback('002_test')
+    columns = [column.name for column in router.database.get_columns('tag')]
+    assert 'created_at' not in columns
+    indexes = [index.columns for index in router.database.get_indexes('person')]
+    assert ['first_name'] not in indexes
+
+    router.rollback('001_test')
+    assert 'person' not in router.database.get_tables()
+    assert migrations.count() == 0
+
 
 def test_router_merge(router, migrations_dir):
     MigrateHistory = router.model
@@ -82,4 +125,518 @@ def test_router_schema(tmpdir):
         assert router.schema == schema_name
         assert router.migrator.schema == schema_name
 
+
+def test_router_check(router):
+    router.run()
+    assert router.check() == {}
+
+    # expressions of indexes are not compared
+    migrator = router.migrator
+    migrator.add_index('person', 'first_name', 'lower(email)')
+    migrator.run()
+    assert router.check() == {}
+
+    router.database.execute_sql('ALTER TABLE person ADD COLUMN extra INTEGER')
+    router.database.execute_sql('DROP INDEX person_last_name')
+
+    drift = router.check()
+    assert list(drift) == [None]
+    assert sorted((d.kind, d.table, d.name, d.diff) for d in drift[None]) == [
+        ('column', 'person', 'extra', {'exists': (False, True)}),
+        ('index', 'person', 'last_name', {'exists': (True, False)}),
+    ]
+
+
+def test_router_advise(router):
+    import peewee as pw
+
+    router.run()
+    assert router.advise() == []
+    assert router.advise(live=True) == []
+
+    migrator = router.migrator
+
+    @migrator.create_model
+    class Comment(pw.Model):
+        person = pw.ForeignKeyField(migrator.orm['person'], index=False)
+        tag = pw.ForeignKeyField(migrator.orm['tag'])
+
+    migrator.run()
+    assert router.advise() == [('comment', 'person_id')]
+    assert router.advise(live=True) == [('comment', 'person_id')]
+
+
+def test_router_create_advise(tmpdir):
+    import peewee as pw
+
+    from peewee_migrate.router import Router
+
+    class Author(pw.Model):
+        name = pw.CharField()
+
+    class Book(pw.Model):
+        author = pw.ForeignKeyField(Author, index=False)
+
+    migrations = tmpdir.mkdir('migrations')
+    router = Router(pw.SqliteDatabase(':memory:'), migrate_dir=str(migrations))
+    with mock.patch('peewee_migrate.router.load_models', return_value=[Author, Book]):
+        name = router.create('first', auto='models', advise=True)
+        assert "migrator.add_index('book', 'author', unique=False)" in \
+            migrations.join(name + '.py').read()
+        assert router.run() == [name]
+
+        # advised index is kept, it isn't advised again
+        assert router.create('second', auto='models', advise=True) is None
+        assert router.todo == [name]
+
+        router.rollback(name)
+        assert router.done == []
+
+
+def test_router_resources(tmpdir, migrations_dir, database):
+    import sys
+    import zipfile
+
+    from peewee_migrate.cli import get_router
+    from peewee_migrate.router import ResourceRouter, format_manifest
+
+    fs_router = get_router(str(migrations_dir), database)
+    names = fs_router.todo
+    archive = str(tmpdir.join('app.zip'))
+    with zipfile.ZipFile(archive, 'w') as zf:
+        zf.writestr('zipped_migrations/__init__.py', '')
+        zf.writestr('zipped_migrations/manifest.txt',
+                    format_manifest(fs_router.manifest_entries(names[:2])))
+        for name in names:
+            zf.write(str(migrations_dir / (name + '.py')), 'zipped_migrations/%s.py' % name)
+
+    sys.path.insert(0, archive)
+    try:
+        router = ResourceRouter(database, migrate_package='zipped_migrations')
+        assert router.todo == names[:2]
+        assert router.run() == names[:2]
+        assert 'person' in router.migrator.orm
+        assert router.diff == []
+    finally:
+        sys.path.remove(archive)
+        sys.modules.pop('zipped_migrations', None)
+
+
+def test_module_router_reads_submodules(database):
+    from peewee_migrate.router import ModuleRouter
+
+    router = ModuleRouter(database, migrate_module='tests.migrations')
+    migrate, rollback = router.read('002_test')
+    assert migrate.__module__ == 'tests.migrations.002_test'
+
+
+def test_router_manifest(tmpdir):
+    from peewee_migrate.cli import get_router
+    from peewee_migrate.router import ManifestEntry, file_hash, format_manifest, parse_manifest
+
+    migrations = tmpdir.mkdir('migrations')
+    router = get_router(str(migrations), 'sqlite:///:memory:')
+    router.create('first')
+    assert router.manifest is None
+
+    router.write_manifest()
+    router.create('second')
+    path = str(migrations.join('002_second.py'))
+    assert router.manifest[-1] == ('002_second', file_hash(path), ('001_first',), {})
+
+    # migration files aren't read for declarations
+    with mock.patch('os.listdir') as listdir, \
+            mock.patch.object(router, 'read_declared') as read_declared:
+        assert router.todo == ['001_first', '002_second']
+        assert router.diff == ['001_first', '002_second']
+        assert not listdir.called and not read_declared.called
+
+    entries = [ManifestEntry('003_checkpoint', 'hash', ('001_first',),
+                             {'replaces': ['001_first', '002_second'], 'depends': []})]
+    assert format_manifest(entries).splitlines()[1] == \
+        '003_checkpoint hash 001_first replaces=001_first,002_second depends='
+    assert parse_manifest(format_manifest(entries)) == entries
+
+    # older manifests have no declarations
+    assert parse_manifest('001_first hash\n002_second hash 001_first\n')[-1].declared is None
+
+    # migrations which are not in manifest are seen with verification only
+    migrations.join('003_manual.py').write('')
+    assert router.todo == ['001_first', '002_second']
+
+    router.verify_manifest = True
+    assert router.todo == ['001_first', '002_second', '003_manual']
+
+    os.remove(str(migrations.join('003_manual.py')))
+    assert router.todo == ['001_first', '002_second']
+
+    migrations.join('002_second.py').write('changed')
+    with mock.patch.object(router.logger, 'warning') as warning:
+        assert router.todo == ['001_first', '002_second']
+        assert warning.called
+
+    router.clear()
+    assert router.manifest == []
+    assert router.scan() == []
+
+
+def test_router_manifest_branches(tmpdir):
+    import peewee as pw
+
+    from peewee_migrate.router import Router
+
+    source = "depends = %r\n\ndef migrate(migrator, database, **kwargs):\n    pass\n"
+    migrations = tmpdir.mkdir('migrations')
+    migrations.join('001_base.py').write(source % None)
+    database = pw.SqliteDatabase(':memory:')
+    router = Router(database, migrate_dir=str(migrations))
+    router.write_manifest()
+
+    migrations.join('002_left.py').write(source % ['001_base'])
+    migrations.join('002_right.py').write(source % ['001_base'])
+    router.declared
+    router.write_manifest()
+    assert [entry.depends for entry in router.manifest] == \
+        [(), ('001_base',), ('001_base',)]
+    assert router.heads() == ['002_left', '002_right']
+
+    router.run('002_right')
+    assert not router.is_up_to_date()
+    assert router.diff == ['002_left']
+
+
+def test_router_squash(tmpdir, migrations_dir, database):
+    import shutil
+
+    from peewee_migrate.cli import get_router
+
+    migrations = tmpdir.join('migrations')
+    shutil.copytree(str(migrations_dir), str(migrations))
+
+    router = get_router(str(migrations), database)
+    router.run()
+    orm = router.migrator.orm
+
+    name = router.squash('checkpoint', end='003_tespy')
+    assert name == '005_checkpoint'
+    assert router.checkpoints == {name: ['001_test', '002_test', '003_tespy']}
+
+    # history is kept, replay uses the checkpoint
+    router = get_router(str(migrations), database)
+    assert router.diff == []
+    with mock.patch.object(router, 'read', wraps=router.read) as read:
+        migrator = router.migrator
+    assert [c[0][0] for c in read.call_args_list] == [name, '004_test_insert']
+    assert sorted(migrator.orm.keys()) == sorted(orm.keys())
+    for model in orm.values():
+        assert list(migrator.orm[model._meta.table_name]._meta.columns) == \
+            list(model._meta.columns)
+
+    # partially applied range is finished by original migrations
+    router.model.delete().where(router.model.name.in_(['002_test', '003_tespy'])).execute()
+    assert router.diff == ['002_test', '003_tespy']
+
+    # fresh database runs the checkpoint in place of replaced migrations
+    router.model.delete().execute()
+    assert router.diff == [name, '004_test_insert']
+
+    with pytest.raises(RuntimeError):
+        router.squash(start='002_test', end='004_test_insert')
+
+
+def test_router_dependencies(tmpdir):
+    import peewee as pw
+
+    from peewee_migrate.router import Router
+
+    migrations = tmpdir.mkdir('migrations')
+    sources = {
+        '001_base': (None, 'base'),
+        '002_left': (['001_base'], 'left'),
+        '002_right': (['001_base'], 'right'),
+        '003_join': (None, 'joined'),
+    }
+    for name, (depends, table) in sources.items():
+        migrations.join(name + '.py').write(
+            'depends = %r\n\n'
+            'def migrate(migrator, database, **kwargs):\n'
+            '    migrator.sql("CREATE TABLE %s (id INTEGER)")\n\n'
+            'def rollback(migrator, database, **kwargs):\n'
+            '    migrator.sql("DROP TABLE %s")\n' % (depends, table, table))
+
+    database = pw.SqliteDatabase(str(tmpdir.join('test.db')))
+    router = Router(database, migrate_dir=str(migrations))
+    assert router.dependencies(router.todo) == {
+        '001_base': [],
+        '002_left': ['001_base'],
+        '002_right': ['001_base'],
+        '003_join': ['002_left', '002_right'],
+    }
+    assert router.diff == ['001_base', '002_left', '002_right', '003_join']
+
+    assert router.run('002_right') == ['001_base', '002_right']
+    assert sorted(router.run(workers=2)) == ['002_left', '003_join']
+    assert set(database.get_tables()) >= {'base', 'left', 'right', 'joined'}
+
+    with pytest.raises(RuntimeError):
+        router.rollback('002_left')
+
+    router.rollback('003_join')
+    router.rollback('002_left')
+    assert router.done == ['001_base', '002_right']
+
+    migrations.join('002_left.py').write("depends = ['003_join']\n")
+    router = Router(database, migrate_dir=str(migrations))
+    with pytest.raises(RuntimeError):
+        router.diff
+
+
+def test_router_declared_without_exec(tmpdir, migrations_dir, database):
+    from peewee_migrate.router import Router, parse_declared
+
+    assert parse_declared("depends = ['001_a']\nreplaces: list = ('a', 'b')\n") == \
+        {'depends': ['001_a'], 'replaces': ['a', 'b']}
+    assert parse_declared("import os\ndef migrate(migrator, database, **kwargs):\n"
+                          "    depends = 1\n") == {}
+    assert parse_declared("depends = ['001_' + 'a']\n") is None
+    assert parse_declared("from base import depends\n") is None
+    assert parse_declared('{"migrate": [], "depends": ["001_a"]}', declarative=True) == \
+        {'depends': ['001_a']}
+
+    router = Router(database, migrate_dir=migrations_dir)
+    with mock.patch.object(router, 'load', wraps=router.load) as load:
+        assert router.declared == {name: {} for name in router.todo}
+        router.run()
+        router.migrator
+        assert router.run() == []
+    assert [c[0][0] for c in load.call_args_list] == router.todo
+
+    tmpdir.join('001_computed.py').write("depends = list()\n")
+    router = Router(database, migrate_dir=str(tmpdir))
+    assert router.declared == {'001_computed': {'depends': []}}
+
+
+def test_router_is_up_to_date(router, database, migrations_dir):
+    from peewee_migrate.router import Router
+
+    fresh = Router(database, migrate_dir=migrations_dir, migrate_table='fresh_history')
+    assert fresh.heads() == ['004_test_insert']
+    with mock.patch.object(fresh, 'load') as load, \
+            mock.patch('peewee_migrate.router.ast.parse') as parse:
+        assert not fresh.is_up_to_date()
+    assert not load.called and not parse.called
+    assert 'fresh_history' not in database.get_tables()
+
+    assert not router.is_up_to_date()
+    router.run('003_tespy')
+    assert not router.is_up_to_date()
+    router.run()
+    assert router.is_up_to_date()
+
+
+def test_router_upgrade_history(database, migrations_dir):
+    import datetime
+
+    import peewee as pw
+
+    from peewee_migrate.router import Router
+
+    class LegacyHistory(pw.Model):
+        name = pw.CharField()
+        migrated_at = pw.DateTimeField(default=datetime.datetime.utcnow)
+
+        class Meta:
+            table_name = 'legacy_history'
+
+    LegacyHistory._meta.database = database
+    LegacyHistory.create_table()
+    for name in ['001_test', '001_test', '002_test']:
+        LegacyHistory.create(name=name)
+
+    router = Router(database, migrate_dir=migrations_dir, migrate_table='legacy_history')
+    assert router.done == ['001_test', '002_test']
+    assert 'duration' in [column.name for column in database.get_columns('legacy_history')]
+    assert not router.upgrade_history()
+
+    with pytest.raises(pw.IntegrityError):
+        with database.atomic():
+            router.model.create(name='002_test')
+
+
+def test_router_declarative(tmpdir, migrations_dir, database):
+    import shutil
+
+    from peewee_migrate.cli import get_router
+
+    migrations = tmpdir.join('migrations')
+    shutil.copytree(str(migrations_dir), str(migrations))
+
+    router = get_router(str(migrations), database)
+    router.run()
+    orm = router.migrator.orm
+
+    router.declarative = True
+    name = router.squash('checkpoint', end='003_tespy')
+    assert migrations.join(name + '.json').check()
+    assert router.checkpoints == {name: ['001_test', '002_test', '003_tespy']}
+
+    # replay and apply without python code
+    router = get_router(str(migrations), database)
+    with mock.patch('peewee_migrate.router.exec_in') as exec_in:
+        migrator = router.replay([name])
+    assert not exec_in.called
+    for model in orm.values():
+        assert list(migrator.orm[model._meta.table_name]._meta.columns) == \
+            list(model._meta.columns)
+
+    database.drop_tables(list(orm.values()))
+    router.model.delete().execute()
+    assert router.run() == [name, '004_test_insert']
+    assert set(database.get_tables()) >= {'person', 'tag'}
+
+    router.rollback('004_test_insert')
+    router.rollback(name)
+    assert 'person' not in database.get_tables()
+
+
+def test_routers_history_tables(database, migrations_dir, tmpdir):
+    import peewee as pw
+
+    from peewee_migrate.router import Router
+
+    router = Router(database, migrate_dir=migrations_dir, journal=True)
+    router.run()
+    assert router.done == router.todo
+    router.journal_model
+
+    router = Router(database, migrate_dir=str(tmpdir), migrate_table='app2_history')
+    router.journal_model
+    router.model.create(name='001_app2')
+    router = Router(database, migrate_dir=str(tmpdir), migrate_table='app2_history')
+    assert router.done == ['001_app2']
+
+    for table in ['migratehistory', 'app2_history']:
+        indexes = {index.name: index for index in database.get_indexes(table)}
+        assert indexes['%s_name' % table].unique
+        journal = {index.name: index for index in database.get_indexes(table + '_journal')}
+        assert journal['%s_journal_name_operation' % table].unique
+
+    with pytest.raises(pw.IntegrityError):
+        with database.atomic():
+            router.model.create(name=router.done[0])
+
+
+def test_routers_isolation(tmpdir, migrations_dir):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import peewee as pw
+
+    from peewee_migrate import MigrateHistory
+    from peewee_migrate.router import Router, fake_queries
+
+    routers = [
+        Router(pw.SqliteDatabase(str(tmpdir.join('%d.db' % num))), migrate_dir=migrations_dir,
+               migrate_table='history%d' % num)
+        for num in range(4)
+    ]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(lambda router: router.run(), routers)) == \
+            [router.todo for router in routers]
+
+    for num, router in enumerate(routers):
+        assert router.model._meta.table_name == 'history%d' % num
+        assert router.done == router.todo
+    assert MigrateHistory._meta.database is None
+    assert MigrateHistory._meta.table_name == 'migratehistory'
+
+    # queries are faked for the current thread only
+    database = routers[0].database
+    with fake_queries(database):
+        assert database.get_tables() == []
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert 'history0' in executor.submit(database.get_tables).result()
+    assert 'history0' in database.get_tables()
+
+
+def test_router_journal(tmpdir):
+    import peewee as pw
+
+    from peewee_migrate.router import Router
+
+    assert Router(pw.MySQLDatabase('test'), migrate_dir=str(tmpdir)).journal
+    assert not Router(pw.SqliteDatabase(':memory:'), migrate_dir=str(tmpdir)).journal
+
+    migrations = tmpdir.mkdir('migrations')
+    migrations.join('001_tables.py').write(
+        'def migrate(migrator, database, **kwargs):\n'
+        '    migrator.sql("CREATE TABLE first (id INTEGER)")\n'
+        '    migrator.sql("CREATE TABLE second (id INTEGER)")\n')
+
+    database = pw.SqliteDatabase(str(tmpdir.join('test.db')))
+    router = Router(database, migrate_dir=str(migrations), journal=True)
+
+    # the first operation is completed by a failed run (non-transactional DDL)
+    database.execute_sql('CREATE TABLE first (id INTEGER)')
+    router.journal_model.create(name='001_tables', operation=0)
+
+    assert router.run() == ['001_tables']
+    assert set(database.get_tables()) >= {'first', 'second'}
+    assert router.journal_model.select().count() == 0
+    # tables of raw sql are drift, the journal isn't
+    assert {d.table for d in router.check()[None]} == {'first', 'second'}
+
+    # completed operations and their entries are kept by rollback of the failed one
+    migrations.join('002_fails.py').write(
+        'def migrate(migrator, database, **kwargs):\n'
+        '    migrator.sql("CREATE TABLE third (id INTEGER)")\n'
+        '    migrator.sql("INSERT INTO unknown VALUES (1)")\n')
+    with pytest.raises(pw.DatabaseError):
+        router.run()
+    assert 'third' in database.get_tables()
+    assert [e.operation for e in router.journal_model.select()] == [0]
+
+    migrations.join('002_fails.py').write(
+        'def migrate(migrator, database, **kwargs):\n'
+        '    migrator.sql("CREATE TABLE third (id INTEGER)")\n'
+        '    migrator.sql("CREATE TABLE fourth (id INTEGER)")\n')
+    assert router.run() == ['002_fails']
+    assert router.journal_model.select().count() == 0
+
+
+def test_router_parallel_journal(tmpdir):
+    import peewee as pw
+
+    from peewee_migrate.router import Router
+
+    migrations = tmpdir.mkdir('migrations')
+    migrations.join('001_tables.py').write(
+        'import peewee as pw\n\n'
+        'def migrate(migrator, database, **kwargs):\n'
+        '    for name in ("first", "second"):\n'
+        '        migrator.create_table(type(name, (pw.Model,), {\n'
+        '            "value": pw.IntegerField(),\n'
+        '            "Meta": type("Meta", (), {"table_name": name})}))\n')
+    source = (
+        'def migrate(migrator, database, **kwargs):\n'
+        '    migrator.parallel(2)\n'
+        '    migrator.add_index("first", "value")\n'
+        '    migrator.add_index("second", "value")\n'
+        '    migrator.sql("%s")\n')
+    migrations.join('002_indexes.py').write(source % 'INSERT INTO unknown VALUES (1)')
+
+    database = pw.SqliteDatabase(str(tmpdir.join('test.db')))
+    router = Router(database, migrate_dir=str(migrations))
+    assert not router.journal
+
+    # concurrent operations are applied outside of the transaction and journaled
+    with pytest.raises(pw.DatabaseError):
+        router.run()
+    assert router.done == ['001_tables']
+    assert [i.name for i in database.get_indexes('second')] == ['second_value']
+    assert sorted(e.operation for e in router.journal_model.select()) == [0, 1]
+
+    migrations.join('002_indexes.py').write(source % 'SELECT 1')
+    assert router.run() == ['002_indexes']
+    assert router.journal_model.select().count() == 0
+
 # pylama:ignore=W0621